@@ -0,0 +1,96 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+from reviews.models import User
+
+from .cache import USER_GENERATION, get_generations
+
+SNAPSHOT_FIELDS = (
+    'id',
+    'username',
+    'role',
+    'is_staff',
+    'is_superuser',
+    'is_active',
+)
+
+
+class LRUCache:
+    """Ограниченный по размеру кэш с временем жизни записей."""
+
+    def __init__(self, maxsize, timeout):
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.timeout, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+user_snapshots = LRUCache(
+    settings.AUTH_USER_CACHE_SIZE, settings.AUTH_USER_CACHE_TIMEOUT
+)
+
+
+def snapshot_user(values):
+    """Пользователь из снимка; остальные поля загрузятся при обращении."""
+    fields = [
+        field.attname
+        for field in User._meta.concrete_fields
+        if field.attname in values
+    ]
+    return User.from_db(
+        User.objects.db, fields, [values[field] for field in fields]
+    )
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWT-аутентификация без запроса пользователя на каждый вызов.
+
+    Токен по-прежнему проверяется целиком, а пользователь собирается
+    из снимка в памяти процесса. Снимок сверяется с общим поколением
+    пользователя, которое сигналы сдвигают при его изменении и удалении.
+    """
+
+    def get_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if user_id is None:
+            return super().get_user(validated_token)
+        (generation,) = get_generations(USER_GENERATION.format(pk=user_id))
+        cached = user_snapshots.get(user_id)
+        if cached is not None and cached[0] == generation:
+            return snapshot_user(cached[1])
+        user = super().get_user(validated_token)
+        user_snapshots.set(
+            user_id,
+            (
+                generation,
+                {field: getattr(user, field) for field in SNAPSHOT_FIELDS},
+            ),
+        )
+        return user
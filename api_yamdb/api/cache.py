@@ -0,0 +1,160 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+TAXONOMY_GENERATION = 'titles:gen:taxonomy'
+
+LIST_GENERATION = 'titles:gen:list'
+
+TITLE_GENERATION = 'titles:gen:title:{pk}'
+
+USER_GENERATION = 'users:gen:{pk}'
+
+SIGNUP_RESEND_WINDOW = 'signup:resend:window:{signature}'
+
+SIGNUP_RESEND_COUNT = 'signup:resend:count:{signature}'
+
+CACHE_HITS = 'titles:cache:hits'
+
+CACHE_MISSES = 'titles:cache:misses'
+
+
+def get_generations(*keys):
+    """Текущие поколения кэша; отсутствующие заводятся заново.
+
+    Начальное значение берётся от времени, чтобы после вытеснения ключа
+    поколение не совпало с одним из прежних.
+    """
+    generations = cache.get_many(keys)
+    for key in keys:
+        if key not in generations:
+            initial = time.time_ns()
+            if not cache.add(key, initial, None):
+                initial = cache.get(key, initial)
+            generations[key] = initial
+    return [generations[key] for key in keys]
+
+
+def bump_generation(key):
+    """Сдвиг поколения: все ключи, собранные на старом, устаревают.
+
+    Поколение не увеличивается, а заменяется новым значением от времени
+    одной записью: incr файлового кэша - это get и set с таймаутом по
+    умолчанию, он терял бы бессрочность ключа и одновременные сдвиги.
+    """
+    cache.set(key, time.time_ns(), None)
+
+
+def invalidate_titles(*title_ids):
+    """Сброс списков произведений и карточек перечисленных произведений."""
+    bump_generation(LIST_GENERATION)
+    for pk in title_ids:
+        if pk is not None:
+            bump_generation(TITLE_GENERATION.format(pk=pk))
+
+
+def invalidate_taxonomy():
+    """Сброс всего кэша произведений при изменении категорий и жанров."""
+    bump_generation(TAXONOMY_GENERATION)
+
+
+def invalidate_user(pk):
+    """Сброс снимков пользователя в кэше аутентификации всех процессов."""
+    bump_generation(USER_GENERATION.format(pk=pk))
+
+
+def signup_signature(username, email):
+    return hashlib.md5(repr((username, email)).encode()).hexdigest()
+
+
+def signup_resend_blocked(username, email):
+    """Код для пары уже отправлен в пределах окна SIGNUP_RESEND_WINDOW."""
+    signature = signup_signature(username, email)
+    return SIGNUP_RESEND_WINDOW.format(signature=signature) in cache
+
+
+def claim_signup_resend(username, email):
+    """Разрешение отправить код: не чаще раза за окно и не больше
+    SIGNUP_RESEND_LIMIT раз за SIGNUP_RESEND_PERIOD.
+
+    Счётчик хранится вместе с концом периода и записывается с остатком
+    периода в таймауте: incr файлового кэша сбросил бы таймаут
+    на значение по умолчанию.
+    """
+    signature = signup_signature(username, email)
+    if not cache.add(
+        SIGNUP_RESEND_WINDOW.format(signature=signature),
+        1,
+        settings.SIGNUP_RESEND_WINDOW,
+    ):
+        return False
+    count_key = SIGNUP_RESEND_COUNT.format(signature=signature)
+    now = time.time()
+    count, expires = cache.get(count_key, (0, now))
+    if expires <= now:
+        count, expires = 0, now + settings.SIGNUP_RESEND_PERIOD
+    count += 1
+    cache.set(count_key, (count, expires), expires - now)
+    return count <= settings.SIGNUP_RESEND_LIMIT
+
+
+def request_signature(request):
+    """Нормализованные параметры запроса: порядок ключей не важен."""
+    params = sorted(
+        (key, request.query_params.getlist(key))
+        for key in request.query_params
+    )
+    raw = repr((request.get_host(), params)).encode()
+    return hashlib.md5(raw).hexdigest()
+
+
+def titles_list_key(request):
+    list_gen, taxonomy_gen = get_generations(
+        LIST_GENERATION, TAXONOMY_GENERATION
+    )
+    return (
+        f'titles:list:{list_gen}:{taxonomy_gen}:'
+        f'{request_signature(request)}'
+    )
+
+
+def titles_facets_key(request):
+    list_gen, taxonomy_gen = get_generations(
+        LIST_GENERATION, TAXONOMY_GENERATION
+    )
+    return (
+        f'titles:facets:{list_gen}:{taxonomy_gen}:'
+        f'{request_signature(request)}'
+    )
+
+
+def title_detail_key(request, pk):
+    title_gen, taxonomy_gen = get_generations(
+        TITLE_GENERATION.format(pk=pk), TAXONOMY_GENERATION
+    )
+    return (
+        f'titles:detail:{pk}:{title_gen}:{taxonomy_gen}:'
+        f'{request_signature(request)}'
+    )
+
+
+def count_access(hit):
+    """Учёт попадания или промаха без таймаута у счётчика.
+
+    Чтение и запись не атомарны, одновременные запросы разных процессов
+    могут терять приращения: счётчики приблизительные.
+    """
+    key = CACHE_HITS if hit else CACHE_MISSES
+    cache.set(key, cache.get(key, 0) + 1, None)
+
+
+def cache_stats():
+    """Приблизительные счётчики попаданий и промахов, см. count_access."""
+    stats = cache.get_many((CACHE_HITS, CACHE_MISSES))
+    return {
+        'hits': stats.get(CACHE_HITS, 0),
+        'misses': stats.get(CACHE_MISSES, 0),
+        'timeout': settings.TITLES_CACHE_TIMEOUT,
+    }
@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+PER_PROCESS_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register(Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    """Поколения кэша и ограничение повторной отправки кодов работают
+    только через кэш, общий для всех процессов."""
+    backend = settings.CACHES.get('default', {}).get('BACKEND')
+    if backend not in PER_PROCESS_CACHES:
+        return []
+    return [
+        Warning(
+            f'Кэш по умолчанию {backend} не общий для процессов.',
+            hint=(
+                'Сброс кэша произведений и пользователей и лимит '
+                'SIGNUP_RESEND_LIMIT действуют только внутри одного '
+                'процесса. Укажите файловый кэш, кэш в базе или Redis.'
+            ),
+            id='api.W001',
+        )
+    ]
@@ -1,15 +1,139 @@
+from django.db.models import Count
 from django_filters import rest_framework as filters
-from reviews.models import Title
+from rest_framework.filters import BaseFilterBackend
+from reviews.models import Category, Genre, Title, TitleGenre
+from reviews.search import search_titles
+
+from .taxonomy import get_taxonomy, prefix_bounds
+
+PREFIX_QUERY_PARAM = 'prefix'
+
+GENRE_MODE_ANY = 'any'
+
+GENRE_MODE_ALL = 'all'
+
+GENRE_MODES = (
+    (GENRE_MODE_ANY, 'Любой из жанров'),
+    (GENRE_MODE_ALL, 'Все жанры'),
+)
+
+
+class PrefixSearchFilter(BaseFilterBackend):
+    """Поиск по началу строки: ?prefix=ab.
+
+    Ищет по нормализованному индексированному полю prefix_search_field
+    вьюсета диапазоном [prefix, upper), который база отвечает по индексу,
+    в отличие от icontains.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        prefix = request.query_params.get(PREFIX_QUERY_PARAM, '').strip()
+        if not prefix:
+            return queryset
+        field = view.prefix_search_field
+        lower, upper = prefix_bounds(prefix.lower())
+        queryset = queryset.filter(**{f'{field}__gte': lower})
+        if upper is not None:
+            queryset = queryset.filter(**{f'{field}__lt': upper})
+        return queryset.order_by(field)
 
 
 class TitleFilter(filters.FilterSet):
     """Фильтры для произведений."""
 
-    genre = filters.CharFilter(field_name='genre__slug')
-    category = filters.CharFilter(field_name='category__slug')
+    genre = filters.CharFilter(method='filter_genre')
+    genre_mode = filters.ChoiceFilter(
+        choices=GENRE_MODES, method='filter_genre_mode'
+    )
+    category = filters.CharFilter(method='filter_category')
     name = filters.CharFilter(field_name='name', lookup_expr='icontains')
     year = filters.NumberFilter(field_name='year')
+    search = filters.CharFilter(method='filter_search')
 
     class Meta:
         model = Title
-        fields = ['genre', 'category', 'name', 'year']
+        fields = ['genre', 'genre_mode', 'category', 'name', 'year', 'search']
+
+    def filter_search(self, queryset, name, value):
+        return search_titles(queryset, value)
+
+    def filter_genre(self, queryset, name, value):
+        """Жанры через запятую: ?genre=drama,comedy&genre_mode=all|any.
+
+        Связи проверяются полусоединением с TitleGenre по индексу
+        (genre_id, title_id), для all - с группировкой по произведению,
+        так что произведения не дублируются и DISTINCT не нужен.
+        """
+        by_slug = get_taxonomy(Genre).by_slug
+        slugs = {slug.strip() for slug in value.split(',') if slug.strip()}
+        genre_ids = [by_slug[slug]['id'] for slug in slugs if slug in by_slug]
+        mode = self.form.cleaned_data.get('genre_mode') or GENRE_MODE_ANY
+        if not genre_ids or (
+            mode == GENRE_MODE_ALL and len(genre_ids) < len(slugs)
+        ):
+            return queryset.none()
+        links = TitleGenre.objects.filter(genre_id__in=genre_ids)
+        if mode == GENRE_MODE_ALL:
+            return queryset.filter(
+                pk__in=links.values('title_id')
+                .annotate(matched=Count('genre_id', distinct=True))
+                .filter(matched=len(genre_ids))
+                .values('title_id')
+            )
+        return queryset.filter(pk__in=links.values('title_id'))
+
+    def filter_genre_mode(self, queryset, name, value):
+        return queryset
+
+    def filter_category(self, queryset, name, value):
+        category = get_taxonomy(Category).by_slug.get(value)
+        if category is None:
+            return queryset.none()
+        return queryset.filter(category_id=category['id'])
+
+
+def title_facets(queryset):
+    """Количество произведений выборки по жанрам, категориям и годам.
+
+    Каждый разрез - один GROUP BY; слаги подставляются из кэша
+    таксономии без соединения с таблицами категорий и жанров.
+    """
+    titles = queryset.order_by()
+    genre_slugs = {
+        item['id']: item['slug'] for item in get_taxonomy(Genre).items
+    }
+    category_slugs = {
+        item['id']: item['slug'] for item in get_taxonomy(Category).items
+    }
+    genres = (
+        titles.values_list('genre')
+        .annotate(count=Count('pk', distinct=True))
+        .order_by()
+    )
+    categories = (
+        titles.values_list('category_id')
+        .annotate(count=Count('pk'))
+        .order_by()
+    )
+    years = titles.values_list('year').annotate(count=Count('pk')).order_by(
+        'year'
+    )
+    return {
+        'genre': sorted(
+            (
+                {'slug': genre_slugs[genre_id], 'count': count}
+                for genre_id, count in genres
+                if genre_id in genre_slugs
+            ),
+            key=lambda facet: facet['slug'],
+        ),
+        'category': sorted(
+            (
+                {'slug': category_slugs[category_id], 'count': count}
+                for category_id, count in categories
+                if category_id in category_slugs
+            ),
+            key=lambda facet: facet['slug'],
+        ),
+        'year': [{'year': year, 'count': count} for year, count in years],
+    }
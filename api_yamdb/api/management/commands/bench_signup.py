@@ -0,0 +1,83 @@
+import random
+import string
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from reviews.models import User
+
+from api.serializers import classify_user
+
+
+def legacy_classify(username, email):
+    """Прежняя проверка регистрации: три запроса с полными строками."""
+    if User.objects.filter(username=username, email=email).last():
+        return
+    if User.objects.filter(username=username):
+        return
+    if User.objects.filter(email=email):
+        return
+
+
+class Command(BaseCommand):
+    """Замер пропускной способности проверки регистрации."""
+
+    help = (
+        'Заполняет базу синтетическими пользователями и сравнивает число '
+        'проверок регистрации в секунду: один запрос classify_user против '
+        'прежних трёх запросов. Все данные откатываются после замера.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100_000)
+        parser.add_argument('--batch', type=int, default=10_000)
+        parser.add_argument('--signups', type=int, default=5_000)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            usernames = self.fill(options['users'], options['batch'])
+            rnd = random.Random(1)
+            pairs = []
+            for number in range(options['signups']):
+                if number % 2:
+                    username = rnd.choice(usernames)
+                else:
+                    username = f'new{number}'
+                pairs.append((username, f'{username}@yamdb.fake'))
+            self.report('classify_user', classify_user, pairs)
+            self.report('три запроса', legacy_classify, pairs)
+            transaction.set_rollback(True)
+
+    def fill(self, total, batch):
+        rnd = random.Random(0)
+        started = time.perf_counter()
+        usernames = []
+        for offset in range(0, total, batch):
+            users = []
+            for number in range(offset, min(offset + batch, total)):
+                username = ''.join(
+                    rnd.choices(string.ascii_lowercase, k=8)
+                ) + str(number)
+                usernames.append(username)
+                users.append(
+                    User(
+                        username=username,
+                        username_lower=username,
+                        email=f'{username}@yamdb.fake',
+                    )
+                )
+            User.objects.bulk_create(users)
+        self.stdout.write(
+            f'Создано пользователей: {total} '
+            f'за {time.perf_counter() - started:.1f} с'
+        )
+        return usernames
+
+    def report(self, label, check, pairs):
+        started = time.perf_counter()
+        for username, email in pairs:
+            check(username, email)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f'{label}: {len(pairs) / elapsed:.0f} проверок в секунду'
+        )
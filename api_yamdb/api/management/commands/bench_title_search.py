@@ -0,0 +1,96 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+from reviews.models import Title
+from reviews.search import title_fts_available
+
+from api.filters import TitleFilter
+
+WORDS = (
+    'поворот', 'проект', 'драма', 'комедия', 'ужас', 'война', 'мир', 'город',
+    'ночь', 'море', 'звезда', 'дорога', 'история', 'тайна', 'герой', 'дом',
+    'сон', 'зима', 'лето', 'осень', 'весна', 'время', 'путь', 'свет',
+)
+
+RARE_WORD = 'тайфун'
+
+RARE_EVERY = 100_000
+
+
+class Command(BaseCommand):
+    """Замер задержки поиска произведений: FTS5 против icontains."""
+
+    help = (
+        'Заполняет базу синтетическими произведениями и сравнивает '
+        'задержку параметра search с поиском icontains. '
+        'Все данные откатываются после замера.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--titles', type=int, default=1_000_000)
+        parser.add_argument('--batch', type=int, default=10_000)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--query', default=RARE_WORD)
+
+    def handle(self, *args, **options):
+        if not title_fts_available():
+            self.stderr.write('Индекс FTS5 недоступен, замер бессмысленен.')
+        with transaction.atomic():
+            self.fill(options['titles'], options['batch'])
+            query = options['query']
+            self.report(
+                'search (FTS5)',
+                lambda: list(
+                    TitleFilter(
+                        {'search': query}, queryset=Title.objects.all()
+                    ).qs[:10]
+                ),
+                options['repeat'],
+            )
+            self.report(
+                'icontains',
+                lambda: list(
+                    Title.objects.filter(
+                        Q(name__icontains=query)
+                        | Q(description__icontains=query)
+                    )[:10]
+                ),
+                options['repeat'],
+            )
+            transaction.set_rollback(True)
+
+    def fill(self, total, batch):
+        rnd = random.Random(0)
+        started = time.perf_counter()
+        for offset in range(0, total, batch):
+            Title.objects.bulk_create(
+                Title(
+                    name=' '.join(rnd.sample(WORDS, 3)),
+                    year=rnd.randint(1900, 2020),
+                    description=' '.join(
+                        rnd.sample(WORDS, 8)
+                        + ([RARE_WORD] if number % RARE_EVERY == 0 else [])
+                    ),
+                )
+                for number in range(offset, min(offset + batch, total))
+            )
+        self.stdout.write(
+            f'Создано произведений: {total} '
+            f'за {time.perf_counter() - started:.1f} с'
+        )
+
+    def report(self, label, run, repeat):
+        run()
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            run()
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        self.stdout.write(
+            f'{label}: медиана {timings[len(timings) // 2]:.2f} мс, '
+            f'максимум {timings[-1]:.2f} мс'
+        )
@@ -0,0 +1,89 @@
+import random
+import string
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import RequestFactory
+from rest_framework.request import Request
+from reviews.models import User
+
+from api.filters import PREFIX_QUERY_PARAM, PrefixSearchFilter
+from api.views import UsersViewCreateAdmin
+
+
+class Command(BaseCommand):
+    """Замер задержки поиска пользователей: по префиксу против icontains."""
+
+    help = (
+        'Заполняет базу синтетическими пользователями и сравнивает '
+        'задержку параметра prefix с поиском icontains по логину. '
+        'Все данные откатываются после замера.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100_000)
+        parser.add_argument('--batch', type=int, default=10_000)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--query', default='qzxj')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.fill(options['users'], options['batch'])
+            query = options['query']
+            request = Request(
+                RequestFactory().get('/', {PREFIX_QUERY_PARAM: query})
+            )
+            view = UsersViewCreateAdmin()
+            self.report(
+                'prefix',
+                lambda: list(
+                    PrefixSearchFilter().filter_queryset(
+                        request, User.objects.all(), view
+                    )[:10]
+                ),
+                options['repeat'],
+            )
+            self.report(
+                'icontains',
+                lambda: list(
+                    User.objects.filter(username__icontains=query)[:10]
+                ),
+                options['repeat'],
+            )
+            transaction.set_rollback(True)
+
+    def fill(self, total, batch):
+        rnd = random.Random(0)
+        started = time.perf_counter()
+        for offset in range(0, total, batch):
+            users = []
+            for number in range(offset, min(offset + batch, total)):
+                username = ''.join(
+                    rnd.choices(string.ascii_letters, k=8)
+                ) + str(number)
+                users.append(
+                    User(
+                        username=username,
+                        username_lower=username.lower(),
+                        email=f'{username}@yamdb.fake',
+                    )
+                )
+            User.objects.bulk_create(users)
+        self.stdout.write(
+            f'Создано пользователей: {total} '
+            f'за {time.perf_counter() - started:.1f} с'
+        )
+
+    def report(self, label, run, repeat):
+        run()
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            run()
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        self.stdout.write(
+            f'{label}: медиана {timings[len(timings) // 2]:.2f} мс, '
+            f'максимум {timings[-1]:.2f} мс'
+        )
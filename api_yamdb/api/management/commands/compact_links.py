@@ -0,0 +1,115 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Q
+from reviews.models import Category, Title, TitleGenre
+
+from api.cache import invalidate_titles
+
+JOIN_RUNS = 5
+
+
+class Command(BaseCommand):
+    """Уборка последствий SET_NULL у связей жанров и категорий."""
+
+    help = (
+        'Удаляет связи TitleGenre без произведения или жанра и переносит '
+        'произведения без категории в категорию --category. Работает '
+        'пакетами по --batch строк, каждый в своей транзакции; '
+        'с --interval повторяет уборку каждые N секунд, с --timing '
+        'замеряет соединение связей с жанрами до и после уборки.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch', type=int, default=1000)
+        parser.add_argument(
+            '--category',
+            help='Слаг категории для произведений без категории.',
+        )
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=0,
+            help='Повторять уборку каждые N секунд.',
+        )
+        parser.add_argument(
+            '--timing',
+            action='store_true',
+            help='Замерить соединение связей с жанрами до и после уборки.',
+        )
+
+    def handle(self, *args, **options):
+        fallback = None
+        if options['category']:
+            fallback = Category.objects.filter(
+                slug=options['category']
+            ).first()
+            if fallback is None:
+                raise CommandError(
+                    f'Категория {options["category"]} не найдена.'
+                )
+        while True:
+            self.compact(options['batch'], fallback, options['timing'])
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
+
+    def compact(self, batch, fallback, timing):
+        before = self.join_time() if timing else None
+        links = self.delete_orphan_links(batch)
+        titles = self.rehome_titles(batch, fallback) if fallback else 0
+        message = (
+            f'Удалено связей: {links}, перенесено произведений: {titles}'
+        )
+        if timing:
+            message += (
+                f', соединение связей: {before:.2f} мс -> '
+                f'{self.join_time():.2f} мс'
+            )
+        self.stdout.write(self.style.SUCCESS(message))
+
+    def delete_orphan_links(self, batch):
+        orphans = TitleGenre.objects.filter(
+            Q(title=None) | Q(genre=None)
+        ).values_list('pk', flat=True)
+        total = 0
+        while True:
+            with transaction.atomic():
+                ids = list(orphans[:batch])
+                if not ids:
+                    return total
+                deleted, _ = TitleGenre.objects.filter(pk__in=ids).delete()
+            total += deleted
+
+    def rehome_titles(self, batch, fallback):
+        orphans = Title.objects.filter(category=None).values_list(
+            'pk', flat=True
+        )
+        total = 0
+        while True:
+            with transaction.atomic():
+                ids = list(orphans[:batch])
+                if not ids:
+                    return total
+                Title.objects.filter(pk__in=ids).update(category=fallback)
+                Title.bump_version(ids)
+            invalidate_titles(*ids)
+            total += len(ids)
+
+    def join_time(self):
+        """Медианное время соединения связей с жанрами, мс.
+
+        База проходит всё соединение, но отдаёт только COUNT, поэтому
+        замер не переносит таблицу связей в память процесса.
+        """
+        links = TitleGenre.objects.filter(
+            title__name__isnull=False, genre__slug__isnull=False
+        )
+        timings = []
+        for _ in range(JOIN_RUNS):
+            started = time.perf_counter()
+            links.count()
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        return timings[len(timings) // 2]
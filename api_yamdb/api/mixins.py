@@ -0,0 +1,235 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.shortcuts import get_object_or_404
+from django.utils.functional import cached_property
+from django.utils.http import parse_etags
+from rest_framework import permissions, status
+from rest_framework.response import Response
+from reviews.models import Review, Title
+
+from .cache import (
+    count_access,
+    request_signature,
+    title_detail_key,
+    titles_list_key,
+)
+from .pagination import (
+    CURSOR_PAGINATION,
+    PAGINATION_QUERY_PARAM,
+    KeysetPagination,
+)
+
+FIELDS_QUERY_PARAM = 'fields'
+
+TITLE_ID_KWARG = 'title_id'
+
+REVIEW_ID_KWARG = 'review_id'
+
+
+def etag_matches(request, etag):
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if not if_none_match:
+        return False
+    etags = parse_etags(if_none_match)
+    return '*' in etags or etag in etags
+
+
+def not_modified(etag):
+    return Response(
+        status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag}
+    )
+
+
+class ParentObjectsMixin:
+    """Произведение и рецензия из URL, загружаемые один раз за запрос.
+
+    Рецензия ищется сразу по своему id и id произведения и приходит
+    вместе с произведением, так что вложенные вьюсеты делают один запрос
+    на разрешение родителей вместо двух в каждом методе.
+    """
+
+    def get_title(self):
+        if not hasattr(self, '_title'):
+            self._title = get_object_or_404(
+                Title, pk=self.kwargs.get(TITLE_ID_KWARG)
+            )
+        return self._title
+
+    def get_review(self):
+        if not hasattr(self, '_review'):
+            self._review = get_object_or_404(
+                Review.objects.select_related('title'),
+                pk=self.kwargs.get(REVIEW_ID_KWARG),
+                title_id=self.kwargs.get(TITLE_ID_KWARG),
+            )
+            self._title = self._review.title
+        return self._review
+
+
+class OptionalCursorPaginationMixin:
+    """Курсорная пагинация по запросу ?pagination=cursor."""
+
+    cursor_pagination_class = KeysetPagination
+
+    @property
+    def paginator(self):
+        if (
+            not hasattr(self, '_paginator')
+            and self.request.query_params.get(PAGINATION_QUERY_PARAM)
+            == CURSOR_PAGINATION
+        ):
+            self._paginator = self.cursor_pagination_class()
+        return super().paginator
+
+
+class CachedTitlesMixin:
+    """Кэширование ответов списка и карточки произведений.
+
+    Ключи включают поколения из api.cache, которые сдвигают сигналы
+    при записи, поэтому устаревшие ответы просто перестают читаться.
+    """
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(
+            titles_list_key(request), super().list, request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        key = title_detail_key(request, kwargs[self.lookup_field])
+        return self.cached_response(
+            key, super().retrieve, request, *args, **kwargs
+        )
+
+    def cached_response(self, key, view, request, *args, **kwargs):
+        cached = cache.get(key)
+        if cached is not None:
+            count_access(hit=True)
+            data, etag = cached
+            if etag and etag_matches(request, etag):
+                return not_modified(etag)
+            response = Response(data, headers={'X-Cache': 'HIT'})
+            if etag:
+                response['ETag'] = etag
+            return response
+        count_access(hit=False)
+        response = view(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            cache.set(
+                key,
+                (response.data, response.get('ETag')),
+                settings.TITLES_CACHE_TIMEOUT,
+            )
+        response['X-Cache'] = 'MISS'
+        return response
+
+
+class TitleETagMixin:
+    """Условный GET по версии произведения (ETag и If-None-Match).
+
+    При If-None-Match версия читается одним запросом по первичному ключу,
+    и совпадение отдаёт 304 без сериализации. Иначе ETag строится по
+    версии произведения, которое вьюсет всё равно загружает, и
+    запоминается в self.title_etag.
+    """
+
+    etag_kind = 'title'
+    etag_title_kwarg = 'pk'
+    etag_actions = ('retrieve',)
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().list, request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+    def make_etag(self, title_id, version):
+        return (
+            f'"{self.etag_kind}-{title_id}-{version}-'
+            f'{request_signature(self.request)}"'
+        )
+
+    def remember_etag(self, title):
+        self.title_etag = self.make_etag(title.pk, title.version)
+
+    def conditional_response(self, view, request, *args, **kwargs):
+        if self.action not in self.etag_actions:
+            return view(request, *args, **kwargs)
+        title_id = kwargs[self.etag_title_kwarg]
+        if request.META.get('HTTP_IF_NONE_MATCH'):
+            version = (
+                Title.objects.filter(pk=title_id)
+                .values_list('version', flat=True)
+                .first()
+            )
+            if version is not None:
+                etag = self.make_etag(title_id, version)
+                if etag_matches(request, etag):
+                    return not_modified(etag)
+        response = view(request, *args, **kwargs)
+        etag = getattr(self, 'title_etag', None)
+        if etag and response.status_code == status.HTTP_200_OK:
+            response['ETag'] = etag
+        return response
+
+
+class SparseFieldsetMixin:
+    """Выбор полей ответа параметром ?fields=id,name,...
+
+    Кроме сокращения ответа урезается и запрос: связи, поля которых не
+    запрошены, не присоединяются и не подгружаются, а крупные колонки
+    откладываются через defer().
+    """
+
+    sparse_select_related = {}
+    sparse_prefetch_related = {}
+    sparse_deferred = {}
+
+    @cached_property
+    def requested_fields(self):
+        if self.request.method not in permissions.SAFE_METHODS:
+            return None
+        value = self.request.query_params.get(FIELDS_QUERY_PARAM)
+        if not value:
+            return None
+        return {name.strip() for name in value.split(',') if name.strip()}
+
+    def get_serializer(self, *args, **kwargs):
+        if self.requested_fields is not None:
+            kwargs.setdefault('fields', self.requested_fields)
+        return super().get_serializer(*args, **kwargs)
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        fields = self.requested_fields
+        if fields is None:
+            return queryset
+        if any(field not in fields for field in self.sparse_select_related):
+            related = [
+                relation
+                for field, relation in self.sparse_select_related.items()
+                if field in fields
+            ]
+            queryset = queryset.select_related(None)
+            if related:
+                queryset = queryset.select_related(*related)
+        if any(field not in fields for field in self.sparse_prefetch_related):
+            related = [
+                relation
+                for field, relation in self.sparse_prefetch_related.items()
+                if field in fields
+            ]
+            queryset = queryset.prefetch_related(None)
+            if related:
+                queryset = queryset.prefetch_related(*related)
+        deferred = [
+            column
+            for field, column in self.sparse_deferred.items()
+            if field not in fields
+        ]
+        if deferred:
+            queryset = queryset.defer(*deferred)
+        return queryset
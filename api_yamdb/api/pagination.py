@@ -0,0 +1,17 @@
+from rest_framework.pagination import CursorPagination
+
+PAGINATION_QUERY_PARAM = 'pagination'
+
+CURSOR_PAGINATION = 'cursor'
+
+
+class KeysetPagination(CursorPagination):
+    """Курсорная пагинация по первичному ключу без COUNT(*) и OFFSET."""
+
+    ordering = '-pk'
+
+
+class RecentReviewsPagination(KeysetPagination):
+    """Лента рецензий: курсор по индексу (pub_date, id)."""
+
+    ordering = ('-pub_date', '-id')
@@ -47,3 +47,17 @@ class AdminOnly(permissions.BasePermission):
         ):
             return True
         return False
+
+
+class ModeratorOrHigher(permissions.BasePermission):
+    """Только для модераторов и администраторов"""
+
+    def has_permission(self, request, view):
+        if request.user.is_authenticated and (
+            request.user.is_moderator
+            or request.user.is_admin
+            or request.user.is_staff
+            or request.user.is_superuser
+        ):
+            return True
+        return False
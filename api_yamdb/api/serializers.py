@@ -2,14 +2,30 @@ import datetime as dt
 
 from django.conf import settings
 from django.contrib.auth.tokens import default_token_generator
-from django.core.mail import send_mail
 from django.core.validators import MaxValueValidator, MinValueValidator
-from django.db.models import Avg
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Q
+from django.utils.encoding import smart_str
 from rest_framework import serializers
-from reviews.models import ROLES, Category, Comment, Genre, Review, Title, User
+from rest_framework.settings import api_settings
+from reviews.models import (
+    ROLES,
+    Category,
+    Comment,
+    Genre,
+    Review,
+    Title,
+    TitleGenre,
+    User,
+)
+from reviews.outbox import enqueue_email
+from reviews.validators import validate_year
 
 from api_yamdb.settings import DEFAULT_FROM_EMAIL
 
+from .cache import claim_signup_resend, signup_resend_blocked
+from .taxonomy import get_taxonomy, taxonomy_object
+
 EMAIL_SUBJECT = 'Код подтверждения'
 EMAIL_LOGIN = 'Логин - '
 EMAIL_TOKEN = '\nКод подтверждения - '
@@ -17,6 +33,16 @@ EMAIL_TOKEN = '\nКод подтверждения - '
 
 DUPLICATE_REVIEW = 'Такая рецензия уже существует.'
 
+FOREIGN_PARENT = 'Можно ответить только на комментарий к этому отзыву.'
+
+PARENT_CHANGED = 'Комментарий нельзя перенести в другую ветку.'
+
+TOO_DEEP = 'Превышена глубина ветки комментариев ({max}).'
+
+CODE_SENT = 'Код подтверждения отправлен на почту'
+
+EMPTY_PURGE = 'Укажите автора, рецензии или комментарии для удаления.'
+
 
 def make_hash_value(user, timestamp):
     """Переопределение метода генерации кода"""
@@ -33,31 +59,67 @@ default_token_generator._make_hash_value = make_hash_value
 
 
 def send_mail_token(user):
-    """Отправка кода подтверждения на почту"""
+    """Постановка письма с кодом подтверждения в очередь run_outbox"""
 
     token = default_token_generator.make_token(user)
     EMAIL_MESSAGE = EMAIL_LOGIN + user.username + EMAIL_TOKEN + token
-    send_mail(EMAIL_SUBJECT, EMAIL_MESSAGE, DEFAULT_FROM_EMAIL, (user.email,))
+    enqueue_email(
+        EMAIL_SUBJECT, EMAIL_MESSAGE, DEFAULT_FROM_EMAIL, (user.email,)
+    )
+
+
+USER_NEW = 'new'
+
+USER_EXISTS = 'exists'
 
+USERNAME_TAKEN = 'username_taken'
 
-def check_username(data):
-    """Проверка имени пользователя"""
+EMAIL_TAKEN = 'email_taken'
 
-    if data['username'].lower() == 'me':
+
+def classify_user(username=None, email=None):
+    """Пара (логин, email) одним запросом: новая, уже зарегистрирована,
+    занят логин или занят email.
+
+    Логин и email уникальны, поэтому совпасть могут не больше двух
+    пользователей. Для зарегистрированной пары возвращается и сам
+    пользователь.
+    """
+    lookups = Q()
+    if username is not None:
+        lookups |= Q(username=username)
+    if email is not None:
+        lookups |= Q(email=email)
+    if not lookups:
+        return USER_NEW, None
+    users = User.objects.filter(lookups).only(
+        'pk', 'username', 'email', 'last_login'
+    )[:2]
+    for user in users:
+        if user.username == username and user.email == email:
+            return USER_EXISTS, user
+    if any(user.username == username for user in users):
+        return USERNAME_TAKEN, None
+    if any(user.email == email for user in users):
+        return EMAIL_TAKEN, None
+    return USER_NEW, None
+
+
+def check_new_user(data, status=None):
+    """Проверка, что логин и email пользователя свободны"""
+
+    username = data.get('username')
+    if username is not None and username.lower() == 'me':
         raise serializers.ValidationError(
             'Нельзя создать пользователя c таким именем'
         )
-
-    elif User.objects.filter(username=data['username']):
+    if status is None:
+        status, _ = classify_user(username, data.get('email'))
+    if status in (USER_EXISTS, USERNAME_TAKEN):
         raise serializers.ValidationError(
             'Пользователь с таким именем уже существует'
         )
-
-
-def check_user_email(data):
-    """Проверка email пользователя"""
-
-    if User.objects.filter(email=data['email']):
+    if status == EMAIL_TAKEN:
         raise serializers.ValidationError('Email уже зарегистрирован')
 
 
@@ -83,10 +145,7 @@ class UserAdminSerializer(serializers.ModelSerializer):
         )
 
     def validate(self, data):
-        if 'username' in data:
-            check_username(data)
-        if 'email' in data:
-            check_user_email(data)
+        check_new_user(data)
 
         return data
 
@@ -113,10 +172,7 @@ class UserEditMeSerializer(serializers.ModelSerializer):
         )
 
     def validate(self, data):
-        if 'username' in data:
-            check_username(data)
-        if 'email' in data:
-            check_user_email(data)
+        check_new_user(data)
 
         return data
 
@@ -133,22 +189,22 @@ class SendCodeSerializer(serializers.ModelSerializer):
         fields = ('email', 'username')
 
     def validate(self, data):
-        user = User.objects.filter(
-            username=data['username'], email=data['email']
-        ).last()
-        if user:
-            send_mail_token(user)
-            raise serializers.ValidationError(
-                'Код подтверждения отправлен на почту'
-            )
+        username, email = data['username'], data['email']
+        if signup_resend_blocked(username, email):
+            raise serializers.ValidationError(CODE_SENT)
+        status, user = classify_user(username, email)
+        if status == USER_EXISTS:
+            if claim_signup_resend(username, email):
+                send_mail_token(user)
+            raise serializers.ValidationError(CODE_SENT)
 
-        check_username(data)
-        check_user_email(data)
+        check_new_user(data, status)
 
         return data
 
     def create(self, validated_data):
         user = User.objects.create(**validated_data)
+        claim_signup_resend(user.username, user.email)
         send_mail_token(user)
 
         return user
@@ -161,6 +217,16 @@ class GetTokenSerializer(serializers.Serializer):
     confirmation_code = serializers.CharField(required=True)
 
 
+class SparseFieldsMixin:
+    """Оставляет в сериализаторе только поля из аргумента fields."""
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
 class CategoriesSerializer(serializers.ModelSerializer):
     """Сериализор для категории."""
 
@@ -177,10 +243,10 @@ class GenresSerializer(serializers.ModelSerializer):
         fields = ('name', 'slug')
 
 
-class TitlesSerializer(serializers.ModelSerializer):
+class TitlesSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Сериализор для произведений для чтения."""
 
-    rating = serializers.SerializerMethodField()
+    rating = serializers.IntegerField(read_only=True)
     category = CategoriesSerializer(read_only=True)
     genre = GenresSerializer(many=True, read_only=True)
 
@@ -196,23 +262,32 @@ class TitlesSerializer(serializers.ModelSerializer):
             'category',
         )
 
-    def get_rating(self, obj):
-        reviews = obj.reviews.all()
-        rating = reviews.aggregate(Avg('score'))
-        if reviews:
-            return int(rating['score__avg'])
-        return None
+
+class TaxonomySlugRelatedField(serializers.SlugRelatedField):
+    """Слаг категории или жанра, разрешаемый по кэшу в памяти процесса."""
+
+    def __init__(self, **kwargs):
+        super().__init__(slug_field='slug', **kwargs)
+
+    def to_internal_value(self, data):
+        try:
+            obj = taxonomy_object(self.get_queryset().model, data)
+        except TypeError:
+            self.fail('invalid')
+        if obj is None:
+            self.fail(
+                'does_not_exist',
+                slug_name=self.slug_field,
+                value=smart_str(data),
+            )
+        return obj
 
 
 class TitlesAddSerializer(serializers.ModelSerializer):
     """Сериализор для произведений для записи."""
 
-    category = serializers.SlugRelatedField(
-        slug_field='slug', queryset=Category.objects.all()
-    )
-    genre = serializers.SlugRelatedField(
-        slug_field='slug', queryset=Genre.objects.all(), many=True
-    )
+    category = TaxonomySlugRelatedField(queryset=Category.objects.all())
+    genre = TaxonomySlugRelatedField(queryset=Genre.objects.all(), many=True)
 
     class Meta:
         model = Title
@@ -227,31 +302,104 @@ class TitlesAddSerializer(serializers.ModelSerializer):
         return value
 
 
-class CurrentTitleDefault:
-    """При вызове возвращает title_id из параметров запроса."""
+class TitlesBulkItemSerializer(serializers.Serializer):
+    """Сериализор одного произведения в пакетной загрузке.
 
-    requires_context = True
+    Слаги не проверяются по базе: их разрешает bulk_create_titles
+    сразу для всего пакета.
+    """
 
-    def __call__(self, serializer_field):
-        return (
-            serializer_field.context.get('request')
-            .parser_context.get('kwargs')
-            .get('title_id')
+    name = serializers.CharField(max_length=256)
+    year = serializers.IntegerField(validators=[validate_year])
+    description = serializers.CharField(
+        required=False, allow_blank=True, allow_null=True
+    )
+    genre = serializers.ListField(child=serializers.SlugField())
+    category = serializers.SlugField()
+
+
+def slug_does_not_exist(value):
+    return serializers.SlugRelatedField.default_error_messages[
+        'does_not_exist'
+    ].format(slug_name='slug', value=value)
+
+
+def bulk_create_titles(data):
+    """Пакетное создание произведений.
+
+    Категории и жанры всего пакета разрешаются по кэшу таксономии,
+    произведения и связи с жанрами пишутся через bulk_create в одной
+    транзакции. Ошибочные позиции пропускаются и возвращаются вместе
+    с индексом, остальные создаются.
+    """
+    errors, items = [], []
+    for index, item in enumerate(data):
+        serializer = TitlesBulkItemSerializer(data=item)
+        if serializer.is_valid():
+            items.append((index, serializer.validated_data))
+        else:
+            errors.append({'index': index, 'errors': serializer.errors})
+
+    categories = get_taxonomy(Category).by_slug
+    genres = get_taxonomy(Genre).by_slug
+    titles, title_genres = [], []
+    for index, item in items:
+        item_errors = {}
+        if item['category'] not in categories:
+            item_errors['category'] = [slug_does_not_exist(item['category'])]
+        missing = [slug for slug in item['genre'] if slug not in genres]
+        if missing:
+            item_errors['genre'] = [
+                slug_does_not_exist(slug) for slug in missing
+            ]
+        if item_errors:
+            errors.append({'index': index, 'errors': item_errors})
+            continue
+        titles.append(
+            Title(
+                name=item['name'],
+                year=item['year'],
+                description=item.get('description'),
+                category_id=categories[item['category']]['id'],
+            )
         )
+        title_genres.append(dict.fromkeys(item['genre']))
+
+    if not titles:
+        return [], errors
+    with transaction.atomic():
+        Title.objects.bulk_create(titles)
+        if connection.features.can_return_ids_from_bulk_insert:
+            ids = [title.pk for title in titles]
+        else:
+            # Внутри транзакции SQLite держит блокировку записи, поэтому
+            # только что вставленные строки - последние по id.
+            ids = list(
+                Title.objects.order_by('-pk').values_list('pk', flat=True)[
+                    : len(titles)
+                ]
+            )[::-1]
+        TitleGenre.objects.bulk_create(
+            TitleGenre(title_id=title_id, genre_id=genres[slug]['id'])
+            for title_id, slugs in zip(ids, title_genres)
+            for slug in slugs
+        )
+    errors.sort(key=lambda error: error['index'])
+    return ids, errors
+
 
+class ReviewSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    """Сериализация рецензии.
 
-class ReviewSerializer(serializers.ModelSerializer):
-    """Сериализация рецензии."""
+    Повторная рецензия отсекается ограничением review_unique в базе,
+    без предварительного SELECT.
+    """
 
     author = serializers.SlugRelatedField(
-        default=serializers.CurrentUserDefault(),
         read_only=True,
         slug_field='username',
     )
-    title = serializers.PrimaryKeyRelatedField(
-        default=CurrentTitleDefault(),
-        read_only=True,
-    )
+    title = serializers.PrimaryKeyRelatedField(read_only=True)
     score = serializers.IntegerField(
         validators=[
             MinValueValidator(
@@ -271,17 +419,37 @@ class ReviewSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Review
-        fields = ('id', 'text', 'author', 'score', 'pub_date', 'title')
-        validators = [
-            serializers.UniqueTogetherValidator(
-                queryset=Review.objects.all(),
-                fields=('author', 'title'),
-                message=DUPLICATE_REVIEW,
+        fields = (
+            'id',
+            'text',
+            'author',
+            'score',
+            'pub_date',
+            'title',
+            'comments_count',
+        )
+        read_only_fields = ('comments_count',)
+
+    def create(self, validated_data):
+        try:
+            with transaction.atomic():
+                return super().create(validated_data)
+        except IntegrityError:
+            raise serializers.ValidationError(
+                {api_settings.NON_FIELD_ERRORS_KEY: [DUPLICATE_REVIEW]}
             )
-        ]
 
 
-class CommentSerializer(serializers.ModelSerializer):
+class RecentReviewSerializer(ReviewSerializer):
+    """Сериализация рецензии в общей ленте с названием произведения."""
+
+    title_name = serializers.CharField(source='title.name', read_only=True)
+
+    class Meta(ReviewSerializer.Meta):
+        fields = ReviewSerializer.Meta.fields + ('title_name',)
+
+
+class CommentSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Сериализация комментария."""
 
     author = serializers.SlugRelatedField(
@@ -289,7 +457,80 @@ class CommentSerializer(serializers.ModelSerializer):
         read_only=True,
         slug_field='username',
     )
+    parent = serializers.PrimaryKeyRelatedField(
+        queryset=Comment.objects.all(), required=False, allow_null=True
+    )
 
     class Meta:
         model = Comment
-        fields = ('id', 'text', 'author', 'pub_date')
+        fields = ('id', 'text', 'author', 'pub_date', 'parent', 'depth')
+        read_only_fields = ('depth',)
+
+    def validate_parent(self, parent):
+        if self.instance is not None:
+            if parent != self.instance.parent:
+                raise serializers.ValidationError(PARENT_CHANGED)
+            return parent
+        if parent is None:
+            return parent
+        if parent.review_id != self.context['view'].get_review().pk:
+            raise serializers.ValidationError(FOREIGN_PARENT)
+        if parent.depth >= settings.COMMENTS_MAX_DEPTH:
+            raise serializers.ValidationError(
+                TOO_DEEP.format(max=settings.COMMENTS_MAX_DEPTH)
+            )
+        return parent
+
+
+class CommentThreadSerializer(CommentSerializer):
+    """Сериализация верхнего комментария ветки вместе с ответами."""
+
+    replies = CommentSerializer(
+        source='thread_replies', many=True, read_only=True
+    )
+
+    class Meta(CommentSerializer.Meta):
+        fields = CommentSerializer.Meta.fields + ('replies',)
+
+
+class UserCommentSerializer(CommentSerializer):
+    """Сериализация комментария в профиле автора."""
+
+    review = serializers.PrimaryKeyRelatedField(read_only=True)
+    title = serializers.IntegerField(source='review.title_id', read_only=True)
+    title_name = serializers.CharField(
+        source='review.title.name', read_only=True
+    )
+
+    class Meta(CommentSerializer.Meta):
+        fields = CommentSerializer.Meta.fields + (
+            'review', 'title', 'title_name'
+        )
+
+
+class ReviewPreviewSerializer(ReviewSerializer):
+    """Сериализация рецензии с последними комментариями."""
+
+    comments_preview = CommentSerializer(many=True, read_only=True)
+
+    class Meta(ReviewSerializer.Meta):
+        fields = ReviewSerializer.Meta.fields + ('comments_preview',)
+
+
+class PurgeSerializer(serializers.Serializer):
+    """Сериализация запроса на массовое удаление рецензий и комментариев."""
+
+    author = serializers.SlugRelatedField(
+        slug_field='username', queryset=User.objects.all(), required=False
+    )
+    reviews = serializers.ListField(
+        child=serializers.IntegerField(), required=False
+    )
+    comments = serializers.ListField(
+        child=serializers.IntegerField(), required=False
+    )
+
+    def validate(self, data):
+        if not any(data.get(field) for field in self.fields):
+            raise serializers.ValidationError(EMPTY_PURGE)
+        return data
@@ -0,0 +1,40 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from reviews.models import Category, Genre, Review, Title, TitleGenre, User
+
+from .cache import invalidate_taxonomy, invalidate_titles, invalidate_user
+
+# Поколения сдвигаются после фиксации транзакции: иначе параллельный
+# запрос успел бы закэшировать старые данные под новым поколением.
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Genre)
+@receiver(post_delete, sender=Genre)
+def taxonomy_changed(sender, instance, **kwargs):
+    transaction.on_commit(invalidate_taxonomy)
+
+
+@receiver(post_save, sender=Title)
+@receiver(post_delete, sender=Title)
+def title_changed(sender, instance, **kwargs):
+    pk = instance.pk
+    transaction.on_commit(lambda: invalidate_titles(pk))
+
+
+@receiver(post_save, sender=TitleGenre)
+@receiver(post_delete, sender=TitleGenre)
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def title_part_changed(sender, instance, **kwargs):
+    title_id = instance.title_id
+    transaction.on_commit(lambda: invalidate_titles(title_id))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, **kwargs):
+    pk = instance.pk
+    transaction.on_commit(lambda: invalidate_user(pk))
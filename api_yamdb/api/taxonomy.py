@@ -0,0 +1,79 @@
+import sys
+import time
+from bisect import bisect_left
+from collections import namedtuple
+
+from django.conf import settings
+
+from .cache import TAXONOMY_GENERATION, get_generations
+
+Taxonomy = namedtuple(
+    'Taxonomy',
+    ('generation', 'expires', 'items', 'by_slug', 'names', 'by_name'),
+)
+
+_taxonomies = {}
+
+
+def get_taxonomy(model):
+    """Все категории или жанры из памяти процесса.
+
+    Копия сверяется с общим поколением TAXONOMY_GENERATION, которое
+    сигналы сдвигают при создании и удалении записей, поэтому после
+    изменения каждый процесс перечитывает таблицу одним запросом.
+    Если поколение всё же не дошло до процесса, копия живёт не дольше
+    TAXONOMY_LOCAL_TIMEOUT секунд.
+    """
+    (generation,) = get_generations(TAXONOMY_GENERATION)
+    taxonomy = _taxonomies.get(model)
+    if (
+        taxonomy is None
+        or taxonomy.generation != generation
+        or taxonomy.expires < time.monotonic()
+    ):
+        items = tuple(model.objects.values('id', 'name', 'slug'))
+        by_name = sorted(items, key=lambda item: item['name'].lower())
+        taxonomy = Taxonomy(
+            generation,
+            time.monotonic() + settings.TAXONOMY_LOCAL_TIMEOUT,
+            items,
+            {item['slug']: item for item in items},
+            [item['name'].lower() for item in by_name],
+            by_name,
+        )
+        _taxonomies[model] = taxonomy
+    return taxonomy
+
+
+def taxonomy_object(model, slug):
+    """Объект по слагу без запроса к базе или None."""
+    item = get_taxonomy(model).by_slug.get(slug)
+    if item is None:
+        return None
+    return model.from_db(model.objects.db, list(item), list(item.values()))
+
+
+def prefix_bounds(prefix):
+    """Полуинтервал строк, начинающихся с prefix: [prefix, upper).
+
+    Последние символы U+10FFFF увеличить нельзя, они отбрасываются;
+    если от prefix ничего не осталось, верхней границы нет и upper None.
+    """
+    head = prefix.rstrip(chr(sys.maxunicode))
+    if not head:
+        return prefix, None
+    return prefix, head[:-1] + chr(ord(head[-1]) + 1)
+
+
+def taxonomy_prefix(model, prefix):
+    """Записи, название которых начинается с prefix, по алфавиту.
+
+    Границы диапазона ищутся бинарным поиском по отсортированным
+    названиям в нижнем регистре.
+    """
+    taxonomy = get_taxonomy(model)
+    lower, upper = prefix_bounds(prefix.lower())
+    end = len(taxonomy.names)
+    if upper is not None:
+        end = bisect_left(taxonomy.names, upper)
+    return taxonomy.by_name[bisect_left(taxonomy.names, lower):end]
@@ -6,9 +6,13 @@ from .views import (
     CommentViewSet,
     GenresViewSet,
     GetToken,
+    PurgeView,
+    RecentReviewsView,
     ReviewViewSet,
     SendCode,
     TitlesViewSet,
+    UserCommentsView,
+    UserReviewsView,
     UsersViewCreateAdmin,
     UserView,
     UserViewPatchDelAdmin,
@@ -33,10 +37,14 @@ router.register(
 router.register('titles', TitlesViewSet)
 
 urlpatterns = [
+    path('v1/reviews/recent/', RecentReviewsView.as_view()),
+    path('v1/moderation/purge/', PurgeView.as_view()),
     path('v1/', include(router.urls)),
     path('v1/auth/token/', GetToken.as_view()),
     path('v1/auth/signup/', SendCode.as_view()),
     path('v1/users/', UsersViewCreateAdmin.as_view()),
     path('v1/users/me/', UserView.as_view()),
     path('v1/users/<str:username>/', UserViewPatchDelAdmin.as_view()),
+    path('v1/users/<str:username>/reviews/', UserReviewsView.as_view()),
+    path('v1/users/<str:username>/comments/', UserCommentsView.as_view()),
 ]
@@ -1,4 +1,7 @@
+from django.conf import settings
 from django.contrib.auth.tokens import default_token_generator
+from django.db import transaction
+from django.db.models import Q
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import (
@@ -9,29 +12,67 @@ from rest_framework import (
     status,
     viewsets,
 )
+from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework_simplejwt.tokens import AccessToken
-from reviews.models import Category, Genre, Review, Title, User
+from reviews.models import (
+    PATH_SEGMENT_LENGTH,
+    Category,
+    Comment,
+    Genre,
+    Review,
+    Title,
+    User,
+)
 
-from .filters import TitleFilter
-from .permissions import AdminOnly, AdminOrReadOnly, AuthorOrHigher
+from .cache import cache_stats, invalidate_titles, titles_facets_key
+from .filters import (
+    PREFIX_QUERY_PARAM,
+    PrefixSearchFilter,
+    TitleFilter,
+    title_facets,
+)
+from .mixins import (
+    TITLE_ID_KWARG,
+    CachedTitlesMixin,
+    OptionalCursorPaginationMixin,
+    ParentObjectsMixin,
+    SparseFieldsetMixin,
+    TitleETagMixin,
+)
+from .pagination import KeysetPagination, RecentReviewsPagination
+from .permissions import (
+    AdminOnly,
+    AdminOrReadOnly,
+    AuthorOrHigher,
+    ModeratorOrHigher,
+)
 from .serializers import (
     CategoriesSerializer,
     CommentSerializer,
+    CommentThreadSerializer,
     GenresSerializer,
     GetTokenSerializer,
+    PurgeSerializer,
+    RecentReviewSerializer,
+    ReviewPreviewSerializer,
     ReviewSerializer,
     SendCodeSerializer,
     TitlesAddSerializer,
     TitlesSerializer,
     UserAdminSerializer,
+    UserCommentSerializer,
     UserEditMeSerializer,
+    bulk_create_titles,
 )
+from .taxonomy import get_taxonomy, taxonomy_prefix
+
+DEPTH_QUERY_PARAM = 'depth'
 
-TITLE_ID_KWARG = 'title_id'
+INCLUDE_QUERY_PARAM = 'include'
 
-REVIEW_ID_KWARG = 'review_id'
+COMMENTS_PREVIEW = 'comments_preview'
 
 
 class SendCode(generics.CreateAPIView):
@@ -77,6 +118,24 @@ class BaseViewSetCategoriesGenres(
     search_fields = ('name',)
     lookup_field = 'slug'
 
+    def list(self, request, *args, **kwargs):
+        """Список без поиска отдаётся из кэша таксономии в памяти.
+
+        Поиск по началу названия ?prefix= идёт по тому же кэшу.
+        """
+        if request.query_params.get(filters.SearchFilter.search_param):
+            return super().list(request, *args, **kwargs)
+        prefix = request.query_params.get(PREFIX_QUERY_PARAM, '').strip()
+        if prefix:
+            items = taxonomy_prefix(self.queryset.model, prefix)
+        else:
+            items = get_taxonomy(self.queryset.model).items
+        page = self.paginate_queryset(items)
+        if page is None:
+            return Response(self.get_serializer(items, many=True).data)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
 
 class CategoriesViewSet(BaseViewSetCategoriesGenres):
     """Просмотр и редактирование категорий."""
@@ -92,29 +151,95 @@ class GenresViewSet(BaseViewSetCategoriesGenres):
     serializer_class = GenresSerializer
 
 
-class TitlesViewSet(viewsets.ModelViewSet):
+class TitlesViewSet(
+    CachedTitlesMixin,
+    TitleETagMixin,
+    SparseFieldsetMixin,
+    OptionalCursorPaginationMixin,
+    viewsets.ModelViewSet,
+):
     """Просмотр и редактирование произведений."""
 
-    queryset = Title.objects.all()
+    queryset = Title.objects.select_related('category').prefetch_related(
+        'genre'
+    )
     serializer_class = TitlesSerializer
     permission_classes = (AdminOrReadOnly,)
     filter_backends = (DjangoFilterBackend,)
     filterset_class = TitleFilter
+    sparse_select_related = {'category': 'category'}
+    sparse_prefetch_related = {'genre': 'genre'}
+    sparse_deferred = {'description': 'description'}
 
     def get_serializer_class(self):
         if self.request.method == 'POST' or self.request.method == 'PATCH':
             return TitlesAddSerializer
         return super().get_serializer_class()
 
+    def get_object(self):
+        title = super().get_object()
+        self.remember_etag(title)
+        return title
+
+    @transaction.atomic
+    def perform_update(self, serializer):
+        title = serializer.save()
+        Title.bump_version([title.pk])
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """Пакетное создание произведений с ошибками по позициям."""
+        if not isinstance(request.data, list):
+            return Response(
+                {'message': 'Ожидается список произведений'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        ids, errors = bulk_create_titles(request.data)
+        if ids:
+            invalidate_titles()
+        titles = self.get_queryset().filter(pk__in=ids).order_by('pk')
+        return Response(
+            {
+                'created': TitlesSerializer(titles, many=True).data,
+                'errors': errors,
+            },
+            status=status.HTTP_201_CREATED
+            if ids
+            else status.HTTP_400_BAD_REQUEST,
+        )
+
+    @action(detail=False)
+    def facets(self, request):
+        """Количество произведений по жанрам, категориям и годам.
+
+        Считается для тех же параметров, что и список, и кэшируется
+        по их сигнатуре.
+        """
+        return self.cached_response(
+            titles_facets_key(request), self.facets_response, request
+        )
+
+    def facets_response(self, request):
+        titles = self.filter_queryset(Title.objects.all())
+        return Response(title_facets(titles))
+
+    @action(
+        detail=False, url_path='cache-stats', permission_classes=(AdminOnly,)
+    )
+    def cache_stats(self, request):
+        """Приблизительные счётчики попаданий и промахов кэша произведений."""
+        return Response(cache_stats())
+
 
 class UsersViewCreateAdmin(generics.ListCreateAPIView):
     """Просмотр и создание пользователей администратором"""
 
     queryset = User.objects.all()
     serializer_class = UserAdminSerializer
-    filter_backends = (filters.SearchFilter,)
+    filter_backends = (filters.SearchFilter, PrefixSearchFilter)
     permission_classes = (AdminOnly,)
     search_fields = ('username',)
+    prefix_search_field = 'username_lower'
     lookup_field = 'username'
 
 
@@ -135,19 +260,35 @@ class UserView(APIView):
 
     permission_classes = (permissions.IsAuthenticated,)
 
+    def get_profile(self, request):
+        """Пользователь целиком: аутентификация отдаёт лишь снимок полей."""
+        user = request.user
+        deferred = user.get_deferred_fields()
+        if deferred:
+            user.refresh_from_db(fields=deferred)
+        return user
+
     def get(self, request):
-        serializer = UserEditMeSerializer(request.user)
+        serializer = UserEditMeSerializer(self.get_profile(request))
         return Response(serializer.data, status=status.HTTP_200_OK)
 
     def patch(self, request):
-        serializer = UserEditMeSerializer(request.user, data=request.data)
+        serializer = UserEditMeSerializer(
+            self.get_profile(request), data=request.data
+        )
         if serializer.is_valid():
             serializer.save()
             return Response(serializer.data, status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-class ReviewViewSet(viewsets.ModelViewSet):
+class ReviewViewSet(
+    ParentObjectsMixin,
+    TitleETagMixin,
+    SparseFieldsetMixin,
+    OptionalCursorPaginationMixin,
+    viewsets.ModelViewSet,
+):
     """Просмотр и редактирование рецензий."""
 
     serializer_class = ReviewSerializer
@@ -155,26 +296,114 @@ class ReviewViewSet(viewsets.ModelViewSet):
         AuthorOrHigher,
         permissions.IsAuthenticatedOrReadOnly,
     )
+    etag_kind = 'reviews'
+    etag_title_kwarg = TITLE_ID_KWARG
+    etag_actions = ('list',)
+    sparse_select_related = {'author': 'author'}
+    sparse_deferred = {'text': 'text'}
 
     def get_queryset(self):
-        title = get_object_or_404(
-            Title,
-            pk=self.kwargs.get(TITLE_ID_KWARG),
-        )
-        return title.reviews.all()
+        title = self.get_title()
+        self.remember_etag(title)
+        return title.reviews.select_related('author')
+
+    @property
+    def include_comments_preview(self):
+        include = self.request.query_params.get(INCLUDE_QUERY_PARAM, '')
+        return self.action == 'list' and COMMENTS_PREVIEW in include.split(',')
 
+    def get_serializer_class(self):
+        if self.include_comments_preview:
+            return ReviewPreviewSerializer
+        return super().get_serializer_class()
+
+    def paginate_queryset(self, queryset):
+        """Страница рецензий; по ?include=comments_preview с комментариями.
+
+        Последние комментарии всех рецензий страницы читаются одним
+        запросом.
+        """
+        page = super().paginate_queryset(queryset)
+        if page is None or not self.include_comments_preview:
+            return page
+        reviews = {review.pk: review for review in page}
+        for review in page:
+            review.comments_preview = []
+        comments = Comment.latest_for_reviews(
+            list(reviews), settings.COMMENTS_PREVIEW_SIZE
+        ).select_related('author')
+        for comment in comments:
+            reviews[comment.review_id].comments_preview.append(comment)
+        return page
+
+    @transaction.atomic
     def perform_create(self, serializer):
-        title = get_object_or_404(
-            Title,
-            pk=self.kwargs.get(TITLE_ID_KWARG),
-        )
-        serializer.save(
+        title = self.get_title()
+        review = serializer.save(
             author=self.request.user,
             title=title,
         )
+        Title.update_rating(title.pk, score=review.score, count=1)
+
+    @transaction.atomic
+    def perform_update(self, serializer):
+        old_score = serializer.instance.score
+        review = serializer.save()
+        Title.update_rating(review.title_id, score=review.score - old_score)
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        Title.update_rating(
+            instance.title_id, score=-instance.score, count=-1
+        )
+        instance.delete()
+
+
+class RecentReviewsView(generics.ListAPIView):
+    """Лента новых рецензий по всем произведениям."""
+
+    queryset = Review.objects.select_related('title', 'author')
+    serializer_class = RecentReviewSerializer
+    pagination_class = RecentReviewsPagination
+
+
+class BaseUserActivityView(generics.ListAPIView):
+    """Записи одного автора от новых к старым по индексу (author, -id)."""
+
+    pagination_class = KeysetPagination
+
+    def get_author(self):
+        return get_object_or_404(User, username=self.kwargs['username'])
+
+
+class UserReviewsView(BaseUserActivityView):
+    """Рецензии пользователя."""
+
+    serializer_class = RecentReviewSerializer
+
+    def get_queryset(self):
+        return Review.objects.filter(author=self.get_author()).select_related(
+            'title', 'author'
+        )
+
+
+class UserCommentsView(BaseUserActivityView):
+    """Комментарии пользователя."""
 
+    serializer_class = UserCommentSerializer
 
-class CommentViewSet(viewsets.ModelViewSet):
+    def get_queryset(self):
+        return Comment.objects.filter(
+            author=self.get_author()
+        ).select_related('review__title', 'author')
+
+
+class CommentViewSet(
+    ParentObjectsMixin,
+    SparseFieldsetMixin,
+    OptionalCursorPaginationMixin,
+    viewsets.ModelViewSet,
+):
     """Просмотр и редактирование комментариев."""
 
     serializer_class = CommentSerializer
@@ -182,30 +411,147 @@ class CommentViewSet(viewsets.ModelViewSet):
         AuthorOrHigher,
         permissions.IsAuthenticatedOrReadOnly,
     )
+    sparse_select_related = {'author': 'author'}
+    sparse_deferred = {'text': 'text'}
 
     def get_queryset(self):
-        title = get_object_or_404(
-            Title,
-            pk=self.kwargs.get(TITLE_ID_KWARG),
-        )
-        review = get_object_or_404(
-            Review,
-            pk=self.kwargs.get(REVIEW_ID_KWARG),
-            title=title,
+        return self.get_review().comments.select_related('author')
+
+    def get_serializer_class(self):
+        if self.action == 'threads':
+            return CommentThreadSerializer
+        return super().get_serializer_class()
+
+    def get_depth_limit(self):
+        """Глубина ответов из ?depth=, не больше COMMENTS_MAX_DEPTH."""
+        try:
+            depth = int(self.request.query_params[DEPTH_QUERY_PARAM])
+        except (KeyError, ValueError):
+            depth = settings.COMMENTS_MAX_DEPTH
+        return max(0, min(depth, settings.COMMENTS_MAX_DEPTH))
+
+    @action(detail=True)
+    def thread(self, request, *args, **kwargs):
+        """Поддерево комментария одним запросом по диапазону путей."""
+        root = self.get_object()
+        lower, upper = root.subtree_bounds
+        comments = (
+            self.filter_queryset(self.get_queryset())
+            .filter(
+                path__gte=lower,
+                path__lt=upper,
+                depth__lte=root.depth + self.get_depth_limit(),
+            )
+            .order_by('path')
         )
-        return review.comments.all()
+        return Response(self.get_serializer(comments, many=True).data)
+
+    @action(detail=False)
+    def threads(self, request, *args, **kwargs):
+        """Ветки, постранично по верхним комментариям.
+
+        Ответы всех веток страницы читаются одним запросом.
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset.filter(parent=None))
+        roots = {root.path: root for root in page}
+        for root in page:
+            root.thread_replies = []
+        depth = self.get_depth_limit()
+        if roots and depth:
+            bounds = Q()
+            for root in page:
+                lower, upper = root.subtree_bounds
+                bounds |= Q(path__gt=lower, path__lt=upper)
+            replies = queryset.filter(bounds, depth__lte=depth).order_by(
+                'path'
+            )
+            for reply in replies:
+                root_path = reply.path[: PATH_SEGMENT_LENGTH + 1]
+                roots[root_path].thread_replies.append(reply)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
+    @transaction.atomic
     def perform_create(self, serializer):
-        title = get_object_or_404(
-            Title,
-            pk=self.kwargs.get(TITLE_ID_KWARG),
-        )
-        review = get_object_or_404(
-            Review,
-            pk=self.kwargs.get(REVIEW_ID_KWARG),
-            title=title,
-        )
+        review = self.get_review()
         serializer.save(
             author=self.request.user,
             review=review,
         )
+        Review.update_comments_count(review.pk, 1)
+        Title.bump_version([review.title_id])
+
+    @transaction.atomic
+    def perform_update(self, serializer):
+        serializer.save()
+        Title.bump_version([self.get_review().title_id])
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        review = self.get_review()
+        deleted, _ = instance.delete()
+        Review.update_comments_count(review.pk, -deleted)
+        Title.bump_version([review.title_id])
+
+
+class PurgeView(APIView):
+    """Массовое удаление рецензий и комментариев модератором.
+
+    В одной транзакции собираются множества id, которые удаляются
+    прямыми DELETE без загрузки строк и посигнальной обработки. Затем
+    рейтинг, версии произведений и счётчики комментариев затронутых
+    рецензий пересчитываются одним UPDATE на таблицу, а кэш сбрасывается
+    один раз после фиксации.
+    """
+
+    permission_classes = (ModeratorOrHigher,)
+
+    def post(self, request):
+        serializer = PurgeSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        author = serializer.validated_data.get('author')
+        reviews = Review.objects.filter(
+            Q(pk__in=serializer.validated_data.get('reviews', []))
+            | Q(author=author)
+        )
+        with transaction.atomic():
+            review_titles = set(reviews.values_list('pk', 'title_id'))
+            review_ids = {review for review, _ in review_titles}
+            comment_ids = Comment.with_replies(
+                Comment.objects.filter(
+                    Q(pk__in=serializer.validated_data.get('comments', []))
+                    | Q(author=author)
+                )
+            )
+            comment_reviews = set(
+                Comment.objects.filter(pk__in=comment_ids).values_list(
+                    'review_id', 'review__title_id'
+                )
+            )
+            deleted_comments = Comment.objects.filter(
+                Q(pk__in=comment_ids) | Q(review_id__in=review_ids)
+            )._raw_delete(Comment.objects.db)
+            deleted_reviews = Review.objects.filter(
+                pk__in=review_ids
+            )._raw_delete(Review.objects.db)
+            title_ids = {title for _, title in review_titles | comment_reviews}
+            Review.recount_comments(
+                Review.objects.filter(
+                    pk__in={
+                        review
+                        for review, _ in comment_reviews
+                        if review not in review_ids
+                    }
+                )
+            )
+            Title.recount_ratings(Title.objects.filter(pk__in=title_ids))
+            transaction.on_commit(lambda: invalidate_titles(*title_ids))
+        return Response(
+            {
+                'reviews': deleted_reviews,
+                'comments': deleted_comments,
+                'titles': sorted(title_ids),
+            },
+            status=status.HTTP_200_OK,
+        )
@@ -65,6 +65,16 @@ DATABASES = {
     }
 }
 
+# Кэш общий для всех процессов на сервере: через него расходятся
+# поколения кэша произведений, таксономий и пользователей.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache'),
+        'OPTIONS': {'MAX_ENTRIES': 10_000},
+    }
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -100,7 +110,7 @@ AUTH_USER_MODEL = 'reviews.User'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'api.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,
@@ -114,12 +124,40 @@ INVALID_SCORE = 'Оценка должна быть в диапазоне от {
 
 INVALID_YEAR = 'Год не может быть больше текущего.'
 
+COMMENTS_MAX_DEPTH = 10
+
+COMMENTS_PREVIEW_SIZE = 3
+
 DEFAULT_FROM_EMAIL = 'support@yambdb.ru'
 
 EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'e-mail')
 
+OUTBOX_BATCH_SIZE = 100
+
+OUTBOX_MAX_ATTEMPTS = 5
+
+OUTBOX_RETRY_DELAY = 30
+
+OUTBOX_CLAIM_TIMEOUT = 60 * 5
+
+OUTBOX_POLL_INTERVAL = 5
+
+SIGNUP_RESEND_WINDOW = 60
+
+SIGNUP_RESEND_LIMIT = 5
+
+SIGNUP_RESEND_PERIOD = 60 * 60
+
+TITLES_CACHE_TIMEOUT = 60 * 5
+
+TAXONOMY_LOCAL_TIMEOUT = 60
+
+AUTH_USER_CACHE_SIZE = 10_000
+
+AUTH_USER_CACHE_TIMEOUT = 60
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(days=1),
     'AUTH_HEADER_TYPES': ('Bearer',),
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from reviews.models import Review
+
+
+class Command(BaseCommand):
+    """Пересчёт денормализованных счётчиков комментариев рецензий."""
+
+    help = 'Пересчитывает comments_count у всех рецензий.'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            updated = Review.recount_comments()
+        self.stdout.write(
+            self.style.SUCCESS(f'Пересчитано рецензий: {updated}')
+        )
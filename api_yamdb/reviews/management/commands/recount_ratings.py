@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from reviews.models import Title
+
+
+class Command(BaseCommand):
+    """Пересчёт денормализованных счётчиков рейтинга произведений."""
+
+    help = 'Пересчитывает score_sum и review_count у всех произведений.'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            updated = Title.recount_ratings()
+        self.stdout.write(
+            self.style.SUCCESS(f'Пересчитано произведений: {updated}')
+        )
@@ -0,0 +1,41 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from reviews.outbox import deliver_outbox
+
+
+class Command(BaseCommand):
+    """Обработчик очереди писем."""
+
+    help = (
+        'Отправляет письма из очереди пачками по одному соединению '
+        'с почтовым сервером. С --once разбирает готовые письма '
+        'и завершается, иначе опрашивает очередь постоянно.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true')
+        parser.add_argument(
+            '--batch', type=int, default=settings.OUTBOX_BATCH_SIZE
+        )
+        parser.add_argument(
+            '--interval', type=int, default=settings.OUTBOX_POLL_INTERVAL
+        )
+
+    def handle(self, *args, **options):
+        total_sent = total_failed = 0
+        while True:
+            sent, failed = deliver_outbox(options['batch'])
+            total_sent += sent
+            total_failed += failed
+            if sent or failed:
+                continue
+            if options['once']:
+                break
+            time.sleep(options['interval'])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Отправлено писем: {total_sent}, отложено: {total_failed}'
+            )
+        )
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.16 on 2026-10-17 05:57
+
+from django.db import migrations
+import reviews.search
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0002_title_rating_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            reviews.search.install_title_fts,
+            reviews.search.remove_title_fts,
+        ),
+    ]
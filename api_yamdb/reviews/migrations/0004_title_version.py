@@ -0,0 +1,23 @@
+# Generated by Django 2.2.16 on 2026-10-17 06:04
+
+from django.db import migrations, models
+import reviews.search
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0003_title_fts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='title',
+            name='version',
+            field=models.PositiveIntegerField(default=1, verbose_name='Версия'),
+        ),
+        # SQLite пересоздаёт reviews_title и теряет триггеры индекса FTS5.
+        migrations.RunPython(
+            reviews.search.install_title_fts, migrations.RunPython.noop
+        ),
+    ]
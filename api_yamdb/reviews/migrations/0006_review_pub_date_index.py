@@ -0,0 +1,17 @@
+# Generated by Django 2.2.16 on 2026-10-17 06:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0005_review_comments_count'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['pub_date', 'id'], name='review_pub_date_id_idx'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 2.2.16 on 2026-10-17 06:09
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import CharField, Value
+from django.db.models.functions import Cast, Concat, LPad
+
+
+def fill_comment_paths(apps, schema_editor):
+    Comment = apps.get_model('reviews', 'Comment')
+    Comment.objects.update(
+        path=Concat(
+            LPad(Cast('id', CharField()), 10, Value('0')), Value('/')
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0006_review_pub_date_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, verbose_name='Глубина'),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='parent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='replies', to='reviews.Comment', verbose_name='ответ на'),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='path',
+            field=models.CharField(blank=True, max_length=255, verbose_name='Путь в ветке'),
+        ),
+        migrations.RunPython(fill_comment_paths, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['review', 'path'], name='comment_review_path_idx'),
+        ),
+    ]
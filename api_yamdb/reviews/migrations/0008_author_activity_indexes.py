@@ -0,0 +1,21 @@
+# Generated by Django 2.2.16 on 2026-10-17 06:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0007_comment_threads'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['author', '-id'], name='comment_author_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['author', '-id'], name='review_author_id_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 2.2.16 on 2026-10-17 06:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0008_author_activity_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='titlegenre',
+            index=models.Index(fields=['genre', 'title'], name='titlegenre_genre_title_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 2.2.16 on 2026-10-17 06:19
+
+from django.db import migrations, models
+
+
+def fill_username_lower(apps, schema_editor):
+    # Lower() в SQLite не знает не-ASCII букв, поэтому регистр
+    # приводится в Python так же, как в User.save().
+    User = apps.get_model('reviews', 'User')
+    users = []
+    for user in User.objects.only('pk', 'username').iterator():
+        user.username_lower = user.username.lower()
+        users.append(user)
+    User.objects.bulk_update(users, ['username_lower'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0009_titlegenre_genre_title_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='username_lower',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=254, verbose_name='Логин в нижнем регистре'),
+        ),
+        migrations.RunPython(fill_username_lower, migrations.RunPython.noop),
+    ]
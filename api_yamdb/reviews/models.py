@@ -1,7 +1,10 @@
 from django.conf import settings
 from django.contrib.auth.models import AbstractUser
 from django.core.validators import MaxValueValidator, MinValueValidator
-from django.db import models
+from django.db import connections, models
+from django.db.models import Count, F, OuterRef, Subquery, Sum, Window
+from django.db.models.functions import Coalesce, RowNumber
+from django.utils import timezone
 
 from .validators import validate_year
 
@@ -11,6 +14,8 @@ MODERATOR = 'moderator'
 
 ROLES = ((USER, USER), (ADMIN, ADMIN), (MODERATOR, MODERATOR))
 
+PATH_SEGMENT_LENGTH = 10
+
 
 class User(AbstractUser):
     """Модель пользователя"""
@@ -24,6 +29,13 @@ class User(AbstractUser):
     last_name = models.CharField('Имя', max_length=150, blank=True, null=True)
     bio = models.TextField('О пользователе', blank=True)
     role = models.CharField('Роль', choices=ROLES, max_length=10, default=USER)
+    username_lower = models.CharField(
+        'Логин в нижнем регистре',
+        max_length=254,
+        db_index=True,
+        editable=False,
+        default='',
+    )
 
     USERNAME_FIELD = 'username'
     REQUIRED_FIELDS = ['email']
@@ -34,6 +46,13 @@ class User(AbstractUser):
     def __str__(self):
         return self.username
 
+    def save(self, *args, **kwargs):
+        self.username_lower = self.username.lower()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'username' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'username_lower'}
+        super().save(*args, **kwargs)
+
     @property
     def is_admin(self):
         return self.role == ADMIN
@@ -43,6 +62,32 @@ class User(AbstractUser):
         return self.role == MODERATOR
 
 
+class CounterFieldsMixin:
+    """Поля counter_fields меняются только UPDATE с F().
+
+    Обычное сохранение существующей строки их не пишет: иначе оно
+    вернуло бы прочитанные раньше значения поверх чужих сдвигов.
+    """
+
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if (
+            not self._state.adding
+            and not kwargs.get('force_insert')
+            and kwargs.get('update_fields') is None
+        ):
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.counter_fields
+                and field.attname not in deferred
+            ]
+        super().save(*args, **kwargs)
+
+
 class Category(models.Model):
     """Модель категории."""
 
@@ -69,9 +114,11 @@ class Genre(models.Model):
         return self.slug
 
 
-class Title(models.Model):
+class Title(CounterFieldsMixin, models.Model):
     """Модель произведения."""
 
+    counter_fields = ('score_sum', 'review_count', 'version')
+
     name = models.CharField('Название произведения', max_length=256)
     year = models.IntegerField(
         'Год выпуска', validators=[validate_year], db_index=True
@@ -85,6 +132,11 @@ class Title(models.Model):
         related_name='titles',
     )
     genre = models.ManyToManyField(Genre, through='TitleGenre')
+    score_sum = models.PositiveIntegerField('Сумма оценок', default=0)
+    review_count = models.PositiveIntegerField(
+        'Количество рецензий', default=0
+    )
+    version = models.PositiveIntegerField('Версия', default=1)
 
     class Meta:
         ordering = ['-pk']
@@ -92,6 +144,52 @@ class Title(models.Model):
     def __str__(self):
         return self.name
 
+    @property
+    def rating(self):
+        """Средняя оценка по накопленным счётчикам рецензий."""
+        if not self.review_count:
+            return None
+        return self.score_sum // self.review_count
+
+    @classmethod
+    def update_rating(cls, title_id, score=0, count=0):
+        """Сдвиг счётчиков рейтинга одним UPDATE без чтения строки."""
+        cls.objects.filter(pk=title_id).update(
+            score_sum=F('score_sum') + score,
+            review_count=F('review_count') + count,
+            version=F('version') + 1,
+        )
+
+    @classmethod
+    def bump_version(cls, title_ids):
+        """Новая версия произведений для ETag их карточек и рецензий.
+
+        title_ids - список id или подзапрос values() по id произведений.
+        """
+        cls.objects.filter(pk__in=title_ids).update(version=F('version') + 1)
+
+    @classmethod
+    def recount_ratings(cls, queryset=None):
+        """Пересчёт счётчиков рейтинга с нуля по таблице рецензий."""
+        if queryset is None:
+            queryset = cls.objects.all()
+        reviews = (
+            Review.objects.filter(title=OuterRef('pk'))
+            .order_by()
+            .values('title')
+        )
+        return queryset.update(
+            score_sum=Coalesce(
+                Subquery(reviews.annotate(total=Sum('score')).values('total')),
+                0,
+            ),
+            review_count=Coalesce(
+                Subquery(reviews.annotate(total=Count('pk')).values('total')),
+                0,
+            ),
+            version=F('version') + 1,
+        )
+
 
 class TitleGenre(models.Model):
     """Модель связывающая произведения и жанры."""
@@ -111,10 +209,19 @@ class TitleGenre(models.Model):
         related_name='genres',
     )
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['genre', 'title'], name='titlegenre_genre_title_idx'
+            )
+        ]
 
-class Review(models.Model):
+
+class Review(CounterFieldsMixin, models.Model):
     """Модель рецензии."""
 
+    counter_fields = ('comments_count',)
+
     text = models.TextField('отзыв')
     pub_date = models.DateTimeField('Время публикации', auto_now_add=True)
     author = models.ForeignKey(
@@ -146,6 +253,9 @@ class Review(models.Model):
         related_name='reviews',
         verbose_name='произведение',
     )
+    comments_count = models.PositiveIntegerField(
+        'Количество комментариев', default=0
+    )
 
     class Meta:
         ordering = ['-pk']
@@ -155,10 +265,46 @@ class Review(models.Model):
                 name='review_unique',
             )
         ]
+        indexes = [
+            models.Index(
+                fields=['pub_date', 'id'], name='review_pub_date_id_idx'
+            ),
+            models.Index(
+                fields=['author', '-id'], name='review_author_id_idx'
+            ),
+        ]
+
+    @classmethod
+    def update_comments_count(cls, review_id, count):
+        """Сдвиг счётчика комментариев одним UPDATE без чтения строки."""
+        cls.objects.filter(pk=review_id).update(
+            comments_count=F('comments_count') + count
+        )
+
+    @classmethod
+    def recount_comments(cls, queryset=None):
+        """Пересчёт счётчика комментариев с нуля по таблице комментариев."""
+        if queryset is None:
+            queryset = cls.objects.all()
+        comments = (
+            Comment.objects.filter(review=OuterRef('pk'))
+            .order_by()
+            .values('review')
+            .annotate(total=Count('pk'))
+            .values('total')
+        )
+        return queryset.update(
+            comments_count=Coalesce(Subquery(comments), 0)
+        )
 
 
 class Comment(models.Model):
-    """Модель комментария."""
+    """Модель комментария.
+
+    Ответы хранят материализованный путь: id всех предков и свой id,
+    дополненные нулями до одинаковой длины. Поддерево комментария - это
+    диапазон путей, который читается одним запросом по индексу.
+    """
 
     text = models.TextField('комментарий')
     pub_date = models.DateTimeField('Время публикации', auto_now_add=True)
@@ -174,6 +320,112 @@ class Comment(models.Model):
         related_name='comments',
         verbose_name='отзыв',
     )
+    parent = models.ForeignKey(
+        'self',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='replies',
+        verbose_name='ответ на',
+    )
+    path = models.CharField('Путь в ветке', max_length=255, blank=True)
+    depth = models.PositiveSmallIntegerField('Глубина', default=0)
 
     class Meta:
         ordering = ['-pk']
+        indexes = [
+            models.Index(
+                fields=['review', 'path'], name='comment_review_path_idx'
+            ),
+            models.Index(
+                fields=['author', '-id'], name='comment_author_id_idx'
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        creating = self.pk is None
+        if creating and self.parent is not None:
+            self.depth = self.parent.depth + 1
+        super().save(*args, **kwargs)
+        if creating:
+            prefix = self.parent.path if self.parent is not None else ''
+            self.path = f'{prefix}{self.pk:0{PATH_SEGMENT_LENGTH}d}/'
+            Comment.objects.filter(pk=self.pk).update(path=self.path)
+
+    @property
+    def subtree_bounds(self):
+        """Границы путей поддерева: [path, path с '/' на конце -> '0')."""
+        return self.path, self.path[:-1] + '0'
+
+    @classmethod
+    def with_replies(cls, queryset):
+        """id комментариев выборки вместе со всеми ответами на них.
+
+        Ответы собираются по уровням, поэтому запросов не больше
+        глубины ветки.
+        """
+        ids = set(queryset.values_list('pk', flat=True))
+        level = ids
+        while level:
+            level = set(
+                cls.objects.filter(parent_id__in=level).values_list(
+                    'pk', flat=True
+                )
+            ) - ids
+            ids |= level
+        return ids
+
+    @classmethod
+    def latest_for_reviews(cls, review_ids, size):
+        """Последние size комментариев каждой рецензии одним запросом.
+
+        Номер комментария внутри рецензии считает ROW_NUMBER() OVER
+        (PARTITION BY review_id), отбор по нему идёт во вложенном SELECT.
+        """
+        ranked = (
+            cls.objects.filter(review_id__in=review_ids)
+            .annotate(
+                row_number=Window(
+                    expression=RowNumber(),
+                    partition_by=[F('review_id')],
+                    order_by=F('id').desc(),
+                )
+            )
+            .values('id', 'row_number')
+        )
+        sql, params = ranked.query.sql_with_params()
+        quote = connections[cls.objects.db].ops.quote_name
+        pk = quote(cls._meta.pk.column)
+        return cls.objects.extra(
+            where=[
+                f'{quote(cls._meta.db_table)}.{pk} IN (SELECT {pk} '
+                f'FROM ({sql}) ranked WHERE row_number <= %s)'
+            ],
+            params=[*params, size],
+        )
+
+
+class OutboxEmail(models.Model):
+    """Письмо в очереди на отправку командой run_outbox."""
+
+    subject = models.CharField('Тема', max_length=255)
+    body = models.TextField('Текст')
+    from_email = models.CharField('Отправитель', max_length=254)
+    recipient = models.EmailField('Получатель', max_length=254)
+    created = models.DateTimeField('Создано', auto_now_add=True)
+    send_after = models.DateTimeField(
+        'Отправить не раньше', default=timezone.now
+    )
+    attempts = models.PositiveSmallIntegerField('Попыток', default=0)
+    last_error = models.TextField('Последняя ошибка', blank=True)
+
+    class Meta:
+        ordering = ['pk']
+        indexes = [
+            models.Index(
+                fields=['send_after', 'attempts'], name='outbox_pending_idx'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.recipient}: {self.subject}'
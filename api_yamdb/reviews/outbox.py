@@ -0,0 +1,103 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from .models import OutboxEmail
+
+
+def enqueue_email(subject, body, from_email, recipients):
+    """Постановка письма в очередь вместо отправки в запросе."""
+    for recipient in recipients:
+        OutboxEmail.objects.create(
+            subject=subject,
+            body=body,
+            from_email=from_email,
+            recipient=recipient,
+        )
+
+
+def retry_delay(attempts):
+    """Экспоненциальная пауза перед следующей попыткой."""
+    return timedelta(
+        seconds=settings.OUTBOX_RETRY_DELAY * 2 ** (attempts - 1)
+    )
+
+
+def postpone(email, error):
+    """Отложить письмо после неудачной попытки отправки."""
+    email.attempts += 1
+    email.last_error = repr(error)
+    email.send_after = timezone.now() + retry_delay(email.attempts)
+
+
+def claim_emails(batch_size):
+    """Захват пачки готовых писем короткой транзакцией.
+
+    send_after захваченных писем сдвигается на OUTBOX_CLAIM_TIMEOUT,
+    поэтому другие обработчики их не берут, а письма упавшего
+    обработчика вернутся в очередь по истечении этого срока.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        emails = list(
+            OutboxEmail.objects.select_for_update(skip_locked=True).filter(
+                send_after__lte=now,
+                attempts__lt=settings.OUTBOX_MAX_ATTEMPTS,
+            )[:batch_size]
+        )
+        OutboxEmail.objects.filter(
+            pk__in=[email.pk for email in emails]
+        ).update(
+            send_after=now + timedelta(seconds=settings.OUTBOX_CLAIM_TIMEOUT)
+        )
+    return emails
+
+
+def deliver_outbox(batch_size=None):
+    """Отправка одной пачки готовых писем через одно соединение.
+
+    Письма захватываются одной транзакцией, отправляются вне её, а итог
+    записывается второй: отправленные удаляются, неотправленные
+    откладываются с растущей паузой, пока не кончатся попытки
+    OUTBOX_MAX_ATTEMPTS. Если соединение не открылось, откладывается вся
+    пачка. Возвращает число отправленных и неотправленных писем.
+    """
+    emails = claim_emails(batch_size or settings.OUTBOX_BATCH_SIZE)
+    if not emails:
+        return 0, 0
+    sent, failed = [], []
+    connection = get_connection()
+    try:
+        connection.open()
+    except Exception as error:
+        for email in emails:
+            postpone(email, error)
+        failed = emails
+    else:
+        try:
+            for email in emails:
+                message = EmailMessage(
+                    email.subject,
+                    email.body,
+                    email.from_email,
+                    [email.recipient],
+                    connection=connection,
+                )
+                try:
+                    message.send()
+                except Exception as error:
+                    postpone(email, error)
+                    failed.append(email)
+                else:
+                    sent.append(email.pk)
+        finally:
+            connection.close()
+    with transaction.atomic():
+        OutboxEmail.objects.filter(pk__in=sent).delete()
+        OutboxEmail.objects.bulk_update(
+            failed, ['attempts', 'last_error', 'send_after']
+        )
+    return len(sent), len(failed)
@@ -0,0 +1,104 @@
+import re
+
+from django.db import connections
+from django.db.models import Q
+
+TITLE_FTS_TABLE = 'reviews_title_fts'
+
+TITLE_FTS_TRIGGERS = ('reviews_title_fts_ai', 'reviews_title_fts_ad',
+                      'reviews_title_fts_au')
+
+TITLE_FTS_SQL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS reviews_title_fts USING fts5("
+    "name, description, content='reviews_title', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS reviews_title_fts_ai "
+    "AFTER INSERT ON reviews_title BEGIN "
+    "INSERT INTO reviews_title_fts(rowid, name, description) "
+    "VALUES (new.id, new.name, new.description); END",
+    "CREATE TRIGGER IF NOT EXISTS reviews_title_fts_ad "
+    "AFTER DELETE ON reviews_title BEGIN "
+    "INSERT INTO reviews_title_fts(reviews_title_fts, rowid, name, "
+    "description) VALUES ('delete', old.id, old.name, old.description); END",
+    "CREATE TRIGGER IF NOT EXISTS reviews_title_fts_au "
+    "AFTER UPDATE OF name, description ON reviews_title BEGIN "
+    "INSERT INTO reviews_title_fts(reviews_title_fts, rowid, name, "
+    "description) VALUES ('delete', old.id, old.name, old.description); "
+    "INSERT INTO reviews_title_fts(rowid, name, description) "
+    "VALUES (new.id, new.name, new.description); END",
+    "INSERT INTO reviews_title_fts(reviews_title_fts) VALUES ('rebuild')",
+)
+
+_fts_available = {}
+
+
+def fts5_supported(connection):
+    """Проверка, что база - SQLite, собранная с модулем FTS5."""
+    if connection.vendor != 'sqlite':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA compile_options')
+        return ('ENABLE_FTS5',) in cursor.fetchall()
+
+
+def install_title_fts(apps, schema_editor):
+    """Создание индекса FTS5 и триггеров синхронизации с reviews_title.
+
+    SQLite пересоздаёт таблицу при изменении её схемы и теряет триггеры,
+    поэтому миграции, меняющие Title, должны вызывать эту функцию снова.
+    """
+    if not fts5_supported(schema_editor.connection):
+        return
+    for sql in TITLE_FTS_SQL:
+        schema_editor.execute(sql)
+
+
+def remove_title_fts(apps, schema_editor):
+    """Удаление индекса FTS5 и его триггеров."""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for trigger in TITLE_FTS_TRIGGERS:
+        schema_editor.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+    schema_editor.execute(f'DROP TABLE IF EXISTS {TITLE_FTS_TABLE}')
+
+
+def title_fts_available(using='default'):
+    """Есть ли в базе индекс FTS5 произведений (проверяется один раз)."""
+    connection = connections[using]
+    key = (using, connection.settings_dict['NAME'])
+    if key not in _fts_available:
+        _fts_available[key] = (
+            connection.vendor == 'sqlite'
+            and TITLE_FTS_TABLE in connection.introspection.table_names()
+        )
+    return _fts_available[key]
+
+
+def fts_query(text):
+    """Запрос FTS5 из пользовательского ввода: каждое слово - префикс."""
+    terms = re.findall(r'\w+', text)
+    if not terms:
+        return None
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def search_titles(queryset, text):
+    """Ранжированный поиск по названию и описанию произведений.
+
+    Без индекса FTS5 выполняется обычный поиск по вхождению подстроки.
+    """
+    query = fts_query(text)
+    if query is None or not title_fts_available(queryset.db):
+        return queryset.filter(
+            Q(name__icontains=text) | Q(description__icontains=text)
+        )
+    return queryset.extra(
+        tables=[TITLE_FTS_TABLE],
+        where=[
+            f'{TITLE_FTS_TABLE}.rowid = reviews_title.id',
+            f'{TITLE_FTS_TABLE} MATCH %s',
+        ],
+        params=[query],
+        select={'search_rank': f'bm25({TITLE_FTS_TABLE}, 10.0, 1.0)'},
+        order_by=['search_rank'],
+    )
@@ -0,0 +1,59 @@
+from django.db.models.signals import post_delete, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .models import Category, Genre, Review, Title, TitleGenre, User
+
+
+@receiver(pre_delete, sender=User)
+def remember_affected_titles(sender, instance, **kwargs):
+    """Запоминаем произведения, которые изменит каскад удаления автора."""
+    instance._rated_title_ids = set(
+        instance.reviews.values_list('title_id', flat=True)
+    )
+    commented = set(
+        instance.comments.exclude(review__author=instance).values_list(
+            'review_id', 'review__title_id'
+        )
+    )
+    instance._commented_review_ids = {review for review, _ in commented}
+    instance._commented_title_ids = {title for _, title in commented}
+
+
+@receiver(post_delete, sender=User)
+def refresh_affected_titles(sender, instance, **kwargs):
+    """Пересчёт счётчиков и версий произведений после каскада удаления."""
+    reviews = getattr(instance, '_commented_review_ids', set())
+    if reviews:
+        Review.recount_comments(Review.objects.filter(pk__in=reviews))
+    rated = getattr(instance, '_rated_title_ids', set())
+    if rated:
+        Title.recount_ratings(Title.objects.filter(pk__in=rated))
+    commented = getattr(instance, '_commented_title_ids', set()) - rated
+    if commented:
+        Title.bump_version(commented)
+
+
+@receiver(pre_save, sender=User)
+def author_renamed(sender, instance, **kwargs):
+    """Смена логина меняет поле author в рецензиях автора."""
+    if instance.pk is None:
+        return
+    renamed = (
+        User.objects.filter(pk=instance.pk)
+        .exclude(username=instance.username)
+        .exists()
+    )
+    if renamed:
+        Title.bump_version(instance.reviews.values('title_id'))
+
+
+@receiver(pre_delete, sender=Category)
+def category_deleted(sender, instance, **kwargs):
+    Title.bump_version(instance.titles.values('pk'))
+
+
+@receiver(pre_delete, sender=Genre)
+def genre_deleted(sender, instance, **kwargs):
+    Title.bump_version(
+        TitleGenre.objects.filter(genre=instance).values('title_id')
+    )
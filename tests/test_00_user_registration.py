@@ -1,6 +1,9 @@
+from io import StringIO
+
 import pytest
 from django.contrib.auth import get_user_model
 from django.core import mail
+from django.core.management import call_command
 
 User = get_user_model()
 
@@ -85,6 +88,7 @@ class Test00UserRegistration:
         }
         request_type = 'POST'
         response = client.post(self.url_signup, data=valid_data)
+        call_command('run_outbox', '--once', stdout=StringIO())
         outbox_after = mail.outbox  # email outbox after user create
 
         assert response.status_code != 404, (
@@ -279,3 +283,143 @@ class Test00UserRegistration:
             f'Проверьте, что при {request_type} запросе `{self.url_signup}` нельзя создать '
             f'пользователя, username которого уже зарегистрирован и возвращается статус {code}'
         )
+
+    @pytest.mark.django_db(transaction=True)
+    def test_00_signup_outbox_retry(self, client, monkeypatch):
+        from reviews.models import OutboxEmail
+
+        valid_data = {
+            'email': 'outbox@yamdb.fake',
+            'username': 'outbox_user'
+        }
+        outbox_before_count = len(mail.outbox)
+        response = client.post(self.url_signup, data=valid_data)
+        assert response.status_code == 200 and len(mail.outbox) == outbox_before_count, (
+            f'Проверьте, что при POST запросе `{self.url_signup}` письмо ставится в очередь, а не отправляется в запросе'
+        )
+
+        def fail(*args, **kwargs):
+            raise ConnectionError('SMTP недоступен')
+
+        monkeypatch.setattr(mail.EmailMessage, 'send', fail)
+        call_command('run_outbox', '--once', stdout=StringIO())
+        email = OutboxEmail.objects.get()
+        assert email.attempts == 1 and 'SMTP' in email.last_error and email.send_after > email.created, (
+            'Проверьте, что неотправленное письмо остаётся в очереди и откладывается до следующей попытки'
+        )
+        monkeypatch.undo()
+        call_command('run_outbox', '--once', stdout=StringIO())
+        assert OutboxEmail.objects.count() == 1, (
+            'Проверьте, что отложенное письмо не отправляется раньше времени'
+        )
+        OutboxEmail.objects.update(send_after=email.created)
+        call_command('run_outbox', '--once', stdout=StringIO())
+        assert not OutboxEmail.objects.exists() and len(mail.outbox) == outbox_before_count + 1, (
+            'Проверьте, что после паузы письмо отправляется и удаляется из очереди'
+        )
+        assert mail.outbox[-1].to == [valid_data['email']]
+
+    @pytest.mark.django_db(transaction=True)
+    def test_00_signup_outbox_connection_failure(self, client, monkeypatch):
+        from django.core.mail.backends.locmem import EmailBackend
+        from reviews.models import OutboxEmail
+
+        for index in range(2):
+            client.post(self.url_signup, data={
+                'email': f'outbox{index}@yamdb.fake',
+                'username': f'outbox_user{index}'
+            })
+
+        def fail(*args, **kwargs):
+            raise ConnectionRefusedError('SMTP недоступен')
+
+        monkeypatch.setattr(EmailBackend, 'open', fail, raising=False)
+        call_command('run_outbox', '--once', stdout=StringIO())
+        emails = list(OutboxEmail.objects.all())
+        assert len(emails) == 2 and all(
+            email.attempts == 1 and 'SMTP' in email.last_error and email.send_after > email.created
+            for email in emails
+        ), (
+            'Проверьте, что при недоступном SMTP сервере вся пачка писем откладывается до следующей попытки'
+        )
+
+    @pytest.mark.django_db(transaction=True)
+    def test_00_signup_single_validation_query(self, client, django_assert_num_queries):
+        valid_data = {
+            'email': 'single@yamdb.fake',
+            'username': 'single_query'
+        }
+        with django_assert_num_queries(3):
+            response = client.post(self.url_signup, data=valid_data)
+        assert response.status_code == 200, (
+            f'Проверьте, что при POST запросе `{self.url_signup}` проверка логина и email выполняется одним запросом'
+        )
+        with django_assert_num_queries(0):
+            response = client.post(self.url_signup, data=valid_data)
+        assert response.status_code == 400, (
+            f'Проверьте, что повторный POST запрос `{self.url_signup}` в окне повторной отправки не обращается к базе'
+        )
+        for data, field in (
+            ({'email': 'other@yamdb.fake', 'username': 'single_query'}, 'Пользователь с таким именем уже существует'),
+            ({'email': 'single@yamdb.fake', 'username': 'other'}, 'Email уже зарегистрирован'),
+        ):
+            with django_assert_num_queries(1):
+                response = client.post(self.url_signup, data=data)
+            assert response.status_code == 400 and response.json() == {'non_field_errors': [field]}, (
+                f'Проверьте, что при POST запросе `{self.url_signup}` с занятым логином или email возвращается статус 400'
+            )
+
+    @pytest.mark.django_db(transaction=True)
+    def test_00_signup_resend_window(self, client, settings):
+        from django.core.cache import cache
+        from reviews.models import OutboxEmail
+
+        valid_data = {
+            'email': 'resend@yamdb.fake',
+            'username': 'resend_user'
+        }
+        client.post(self.url_signup, data=valid_data)
+        for _ in range(3):
+            client.post(self.url_signup, data=valid_data)
+        assert OutboxEmail.objects.count() == 1, (
+            f'Проверьте, что повторные POST запросы `{self.url_signup}` в окне повторной отправки не ставят письма в очередь'
+        )
+        cache.clear()
+        settings.SIGNUP_RESEND_WINDOW = 0
+        settings.SIGNUP_RESEND_LIMIT = 3
+        for _ in range(4):
+            response = client.post(self.url_signup, data=valid_data)
+            assert response.status_code == 400
+        assert OutboxEmail.objects.count() == 1 + 3, (
+            f'Проверьте, что число писем по POST запросам `{self.url_signup}` ограничено SIGNUP_RESEND_LIMIT'
+        )
+
+    def test_00_signup_resend_period(self, settings, monkeypatch):
+        import time
+
+        from api.cache import claim_signup_resend
+
+        settings.SIGNUP_RESEND_WINDOW = 0
+        settings.SIGNUP_RESEND_LIMIT = 2
+        settings.SIGNUP_RESEND_PERIOD = 60 * 60
+        started = time.time()
+        claims = []
+        for offset in (0, 400, 800, 60 * 60 + 1):
+            monkeypatch.setattr(time, 'time', lambda: started + offset)
+            claims.append(claim_signup_resend('period_user', 'period@yamdb.fake'))
+        monkeypatch.undo()
+        assert claims == [True, True, False, True], (
+            'Проверьте, что лимит повторной отправки кодов действует весь SIGNUP_RESEND_PERIOD, '
+            'даже если запросы идут реже таймаута кэша по умолчанию'
+        )
+
+    def test_00_signup_resend_shared_cache_check(self, settings):
+        from api.checks import check_shared_cache
+
+        assert check_shared_cache(None) == [], (
+            'Проверьте, что для общего кэша проверка настроек не выдаёт предупреждений'
+        )
+        settings.CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        assert [warning.id for warning in check_shared_cache(None)] == ['api.W001'], (
+            'Проверьте, что кэш в памяти процесса вызывает предупреждение: лимит повторной отправки кодов с ним не общий'
+        )
@@ -571,3 +571,60 @@ class Test01UserAPI:
             'Проверьте, что при PATCH запросе `/api/v1/users/me/`, '
             'пользователь с ролью user не может сменить себе роль'
         )
+
+    @pytest.mark.django_db(transaction=True)
+    def test_12_users_prefix_search(self, admin_client, admin):
+        user, moderator = create_users_api(admin_client)
+        response = admin_client.get('/api/v1/users/', data={'prefix': 'testm'})
+        assert response.status_code == 200
+        assert [item['username'] for item in response.json()['results']] == [moderator.username], (
+            'Проверьте, что `/api/v1/users/?prefix=` ищет по началу логина без учёта регистра'
+        )
+        response = admin_client.get('/api/v1/users/', data={'prefix': 'Test'})
+        assert [item['username'] for item in response.json()['results']] == [
+            admin.username, moderator.username, user.username
+        ], (
+            'Проверьте, что `/api/v1/users/?prefix=` возвращает пользователей по алфавиту'
+        )
+        admin_client.patch(f'/api/v1/users/{user.username}/', data={'username': 'Renamed'})
+        response = admin_client.get('/api/v1/users/', data={'prefix': 'ren'})
+        assert [item['username'] for item in response.json()['results']] == ['Renamed'], (
+            'Проверьте, что поиск по началу логина учитывает смену логина'
+        )
+        response = admin_client.get('/api/v1/users/', data={'prefix': '\U0010ffff'})
+        assert response.status_code == 200 and response.json()['count'] == 0, (
+            'Проверьте, что `/api/v1/users/?prefix=` принимает последний символ Юникода'
+        )
+
+    @pytest.mark.django_db(transaction=True)
+    def test_13_cached_authentication(self, admin_client, user, user_client, django_assert_num_queries):
+        user_client.get('/api/v1/users/me/')
+        with django_assert_num_queries(1):
+            response = user_client.get('/api/v1/users/me/')
+        assert response.status_code == 200 and response.json()['email'] == user.email, (
+            'Проверьте, что повторный запрос с тем же токеном не загружает пользователя при аутентификации'
+        )
+        assert user_client.get('/api/v1/users/').status_code == 403
+        admin_client.patch(f'/api/v1/users/{user.username}/', data={'role': 'admin'})
+        assert user_client.get('/api/v1/users/').status_code == 200, (
+            'Проверьте, что смена роли пользователя сразу учитывается при аутентификации'
+        )
+        admin_client.delete(f'/api/v1/users/{user.username}/')
+        assert user_client.get('/api/v1/users/me/').status_code == 401, (
+            'Проверьте, что удалённый пользователь больше не проходит аутентификацию'
+        )
+
+    @pytest.mark.django_db(transaction=True)
+    def test_14_user_invalidation_after_commit(self, user, user_client):
+        from django.db import transaction
+
+        user_client.get('/api/v1/users/')
+        with transaction.atomic():
+            user.role = 'admin'
+            user.save()
+            assert user_client.get('/api/v1/users/').status_code == 403, (
+                'Проверьте, что кэш пользователя сбрасывается только после фиксации транзакции'
+            )
+        assert user_client.get('/api/v1/users/').status_code == 200, (
+            'Проверьте, что после фиксации транзакции смена роли учитывается при аутентификации'
+        )
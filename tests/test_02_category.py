@@ -178,3 +178,29 @@ class Test02CategoryAPI:
             f'Проверьте, что при POST запросе на `{url}`, создание категорий недоступно для '
             f'пользователя с ролью moderator'
         )
+
+    @pytest.mark.django_db(transaction=True)
+    def test_07_category_list_cache(self, client, admin_client, django_assert_num_queries):
+        categories = create_categories(admin_client)
+        client.get('/api/v1/categories/')
+        with django_assert_num_queries(0):
+            response = client.get('/api/v1/categories/')
+        assert response.json()['count'] == len(categories), (
+            'Проверьте, что повторный GET запрос `/api/v1/categories/` отдаётся из кэша без запросов к базе'
+        )
+        admin_client.post('/api/v1/categories/', data={'name': 'Музыка', 'slug': 'music'})
+        response = client.get('/api/v1/categories/')
+        assert response.json()['results'][0]['slug'] == 'music', (
+            'Проверьте, что создание категории сбрасывает кэш списка категорий'
+        )
+        admin_client.delete('/api/v1/categories/music/')
+        response = client.get('/api/v1/titles/', data={'category': 'music'})
+        assert response.json()['count'] == 0, (
+            'Проверьте, что после удаления категории фильтр по её слагу ничего не находит'
+        )
+        response = admin_client.post('/api/v1/titles/', data={
+            'name': 'Альбом', 'year': 2000, 'genre': [], 'category': 'music'
+        })
+        assert response.status_code == 400 and 'category' in response.json(), (
+            'Проверьте, что после удаления категории её слаг не принимается при создании произведения'
+        )
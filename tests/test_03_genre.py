@@ -166,3 +166,36 @@ class Test03GenreAPI:
             f'Проверьте, что при POST запросе на `{url}`, создание жанров недоступно для '
             f'пользователя с ролью moderator'
         )
+
+    @pytest.mark.django_db(transaction=True)
+    def test_07_genre_prefix_search(self, client, admin_client, django_assert_num_queries):
+        create_genre(admin_client)
+        admin_client.post('/api/v1/genres/', data={'name': 'Комиксы', 'slug': 'comics'})
+        client.get('/api/v1/genres/')
+        with django_assert_num_queries(0):
+            response = client.get('/api/v1/genres/', data={'prefix': 'ко'})
+        assert [item['slug'] for item in response.json()['results']] == ['comedy', 'comics'], (
+            'Проверьте, что `/api/v1/genres/?prefix=` ищет по началу названия без учёта регистра и без запросов к базе'
+        )
+        response = client.get('/api/v1/genres/', data={'prefix': 'я'})
+        assert response.json()['count'] == 0, (
+            'Проверьте, что `/api/v1/genres/?prefix=` не находит жанры с другим началом названия'
+        )
+        for prefix in ('\U0010ffff', 'ко\U0010ffff'):
+            response = client.get('/api/v1/genres/', data={'prefix': prefix})
+            assert response.status_code == 200 and response.json()['count'] == 0, (
+                'Проверьте, что `/api/v1/genres/?prefix=` принимает последний символ Юникода'
+            )
+
+    @pytest.mark.django_db(transaction=True)
+    def test_08_genre_local_copy_expires(self, client, admin_client, settings):
+        from reviews.models import Genre
+
+        create_genre(admin_client)
+        settings.TAXONOMY_LOCAL_TIMEOUT = 0
+        client.get('/api/v1/genres/')
+        Genre.objects.bulk_create([Genre(name='Комиксы', slug='comics')])
+        response = client.get('/api/v1/genres/')
+        assert 'comics' in [item['slug'] for item in response.json()['results']], (
+            'Проверьте, что копия жанров в памяти процесса перечитывается по истечении `TAXONOMY_LOCAL_TIMEOUT`'
+        )
@@ -1,3 +1,5 @@
+import json
+
 import pytest
 
 from .common import (auth_client, create_categories, create_genre,
@@ -249,3 +251,331 @@ class Test04TitleAPI:
         user, moderator = create_users_api(admin_client)
         self.check_permissions(user, 'обычного пользователя', titles, categories, genres)
         self.check_permissions(moderator, 'модератора', titles, categories, genres)
+
+    @pytest.mark.django_db(transaction=True)
+    def test_05_titles_query_budget(self, client, admin_client, django_assert_num_queries):
+        titles, _, _ = create_titles(admin_client)
+        for number in range(5):
+            data = {'name': f'Произведение {number}', 'year': 2001, 'genre': ['horror', 'drama'],
+                    'category': 'films'}
+            admin_client.post('/api/v1/titles/', data=data)
+        with django_assert_num_queries(3):
+            response = client.get('/api/v1/titles/')
+        assert len(response.json()['results']) == 7, (
+            'Проверьте, что при GET запросе `/api/v1/titles/` возвращаете все произведения'
+        )
+        with django_assert_num_queries(2):
+            response = client.get(f'/api/v1/titles/{titles[0]["id"]}/')
+        assert response.status_code == 200, (
+            'Проверьте, что при GET запросе `/api/v1/titles/{title_id}/` возвращается статус 200'
+        )
+
+    @pytest.mark.django_db(transaction=True)
+    def test_06_titles_cursor_pagination(self, client, admin_client, django_assert_num_queries):
+        create_titles(admin_client)
+        for number in range(10):
+            data = {'name': f'Произведение {number}', 'year': 2001, 'genre': ['comedy'], 'category': 'books'}
+            admin_client.post('/api/v1/titles/', data=data)
+        with django_assert_num_queries(2):
+            response = client.get('/api/v1/titles/?pagination=cursor')
+        data = response.json()
+        assert 'count' not in data and len(data['results']) == 10 and data['next'], (
+            'Проверьте, что при GET запросе `/api/v1/titles/?pagination=cursor` '
+            'возвращается курсорная пагинация без параметра `count`'
+        )
+        response = client.get(data['next'])
+        next_data = response.json()
+        assert len(next_data['results']) == 2 and next_data['next'] is None, (
+            'Проверьте, что ссылка `next` курсорной пагинации возвращает следующую страницу'
+        )
+        ids = [title['id'] for title in data['results'] + next_data['results']]
+        assert ids == sorted(ids, reverse=True), (
+            'Проверьте, что курсорная пагинация упорядочена по убыванию `id`'
+        )
+
+    @pytest.mark.django_db(transaction=True)
+    def test_07_titles_search(self, client, admin_client):
+        titles, _, _ = create_titles(admin_client)
+        data = {'name': 'Драма о проекте', 'year': 2010, 'genre': ['drama'], 'category': 'books',
+                'description': 'Без поворотов'}
+        admin_client.post('/api/v1/titles/', data=data)
+        response = client.get('/api/v1/titles/?search=проект')
+        results = response.json()['results']
+        assert [title['name'] for title in results] == ['Проект', 'Драма о проекте'], (
+            'Проверьте, что при GET запросе `/api/v1/titles/?search=` результаты ранжируются '
+            'и совпадение в названии важнее совпадения в описании'
+        )
+        response = client.get('/api/v1/titles/?search=пов')
+        assert len(response.json()['results']) == 2, (
+            'Проверьте, что параметр `search` ищет по началу слов в названии и описании'
+        )
+        admin_client.patch(f'/api/v1/titles/{titles[0]["id"]}/', data={'name': 'Разворот'})
+        response = client.get('/api/v1/titles/?search=разворот')
+        assert len(response.json()['results']) == 1, (
+            'Проверьте, что поисковый индекс обновляется при изменении произведения'
+        )
+        admin_client.delete(f'/api/v1/titles/{titles[0]["id"]}/')
+        response = client.get('/api/v1/titles/?search=разворот')
+        assert response.json()['results'] == [], (
+            'Проверьте, что поисковый индекс обновляется при удалении произведения'
+        )
+
+    @pytest.mark.django_db(transaction=True)
+    def test_08_titles_bulk_create(self, client, admin_client, django_assert_max_num_queries):
+        genres = create_genre(admin_client)
+        categories = create_categories(admin_client)
+        data = [
+            {'name': 'Первое', 'year': 1999, 'genre': [genres[0]['slug'], genres[1]['slug']],
+             'category': categories[0]['slug'], 'description': 'Описание'},
+            {'name': 'С ошибкой', 'year': 1999, 'genre': ['unknown'], 'category': categories[0]['slug']},
+            {'name': 'Без года', 'genre': [], 'category': categories[1]['slug']},
+            {'name': 'Второе', 'year': 2005, 'genre': [genres[2]['slug']], 'category': categories[1]['slug']},
+        ]
+        response = client.post('/api/v1/titles/bulk/', data=json.dumps(data), content_type='application/json')
+        assert response.status_code == 401, (
+            'Проверьте, что при POST запросе `/api/v1/titles/bulk/` без токена авторизации возвращается статус 401'
+        )
+        with django_assert_max_num_queries(10):
+            response = admin_client.post('/api/v1/titles/bulk/', data=data, format='json')
+        assert response.status_code == 201, (
+            'Проверьте, что при POST запросе `/api/v1/titles/bulk/` с частично правильными данными '
+            'возвращается статус 201'
+        )
+        result = response.json()
+        assert [title['name'] for title in result['created']] == ['Первое', 'Второе'], (
+            'Проверьте, что при POST запросе `/api/v1/titles/bulk/` создаются все правильные произведения'
+        )
+        assert [error['index'] for error in result['errors']] == [1, 2], (
+            'Проверьте, что при POST запросе `/api/v1/titles/bulk/` возвращаются ошибки с индексами позиций'
+        )
+        assert 'genre' in result['errors'][0]['errors'] and 'year' in result['errors'][1]['errors'], (
+            'Проверьте, что ошибки пакетной загрузки указывают на неправильные поля'
+        )
+        response = client.get(f'/api/v1/titles/{result["created"][0]["id"]}/')
+        data = response.json()
+        assert data['category'] == categories[0] and data['genre'] == [genres[1], genres[0]], (
+            'Проверьте, что при POST запросе `/api/v1/titles/bulk/` сохраняются категория и жанры'
+        )
+        response = client.get('/api/v1/titles/?search=второе')
+        assert len(response.json()['results']) == 1, (
+            'Проверьте, что произведения из пакетной загрузки попадают в поисковый индекс'
+        )
+
+    @pytest.mark.django_db(transaction=True)
+    def test_09_titles_response_cache(self, client, admin_client, admin, django_assert_num_queries):
+        titles, categories, genres = create_titles(admin_client)
+        client.get('/api/v1/titles/?year=2000&genre=horror')
+        with django_assert_num_queries(0):
+            response = client.get('/api/v1/titles/?genre=horror&year=2000')
+        assert response['X-Cache'] == 'HIT' and len(response.json()['results']) == 1, (
+            'Проверьте, что повторный GET запрос `/api/v1/titles/` с теми же параметрами '
+            'отдаётся из кэша без запросов к базе'
+        )
+        client.get(f'/api/v1/titles/{titles[0]["id"]}/')
+        client.get(f'/api/v1/titles/{titles[1]["id"]}/')
+        admin_client.post(f'/api/v1/titles/{titles[0]["id"]}/reviews/', data={'text': 'Текст', 'score': 8})
+        response = client.get(f'/api/v1/titles/{titles[0]["id"]}/')
+        assert response['X-Cache'] == 'MISS' and response.json()['rating'] == 8, (
+            'Проверьте, что кэш карточки произведения сбрасывается при добавлении отзыва'
+        )
+        response = client.get(f'/api/v1/titles/{titles[1]["id"]}/')
+        assert response['X-Cache'] == 'HIT', (
+            'Проверьте, что отзыв сбрасывает кэш только своего произведения'
+        )
+        response = client.get('/api/v1/titles/?genre=horror&year=2000')
+        assert response['X-Cache'] == 'MISS' and response.json()['results'][0]['rating'] == 8, (
+            'Проверьте, что кэш списка произведений сбрасывается при добавлении отзыва'
+        )
+        admin_client.delete(f'/api/v1/genres/{genres[0]["slug"]}/')
+        response = client.get(f'/api/v1/titles/{titles[1]["id"]}/')
+        assert response['X-Cache'] == 'MISS', (
+            'Проверьте, что кэш произведений сбрасывается при удалении жанра'
+        )
+        response = client.get('/api/v1/titles/cache-stats/')
+        assert response.status_code == 401, (
+            'Проверьте, что счётчики кэша недоступны без токена авторизации'
+        )
+        response = admin_client.get('/api/v1/titles/cache-stats/')
+        assert response.json()['hits'] == 2 and response.json()['misses'] == 6, (
+            'Проверьте, что `/api/v1/titles/cache-stats/` возвращает счётчики попаданий и промахов кэша'
+        )
+
+    @pytest.mark.django_db(transaction=True)
+    def test_10_titles_sparse_fields(self, client, admin_client, django_assert_num_queries):
+        titles, _, _ = create_titles(admin_client)
+        with django_assert_num_queries(2) as context:
+            response = client.get('/api/v1/titles/?fields=id,name,rating')
+        assert [set(title) for title in response.json()['results']] == [{'id', 'name', 'rating'}] * 2, (
+            'Проверьте, что при GET запросе `/api/v1/titles/?fields=` возвращаются только запрошенные поля'
+        )
+        assert 'description' not in context.captured_queries[-1]['sql'], (
+            'Проверьте, что при GET запросе `/api/v1/titles/?fields=` не запрошенные колонки не читаются из базы'
+        )
+        response = client.get(f'/api/v1/titles/{titles[0]["id"]}/?fields=name,genre')
+        assert response.json() == {'name': titles[0]['name'], 'genre': [
+            {'name': 'Комедия', 'slug': 'comedy'}, {'name': 'Ужасы', 'slug': 'horror'}
+        ]}, (
+            'Проверьте, что при GET запросе `/api/v1/titles/{title_id}/?fields=` возвращаются только запрошенные поля'
+        )
+
+    @pytest.mark.django_db(transaction=True)
+    def test_11_titles_multi_genre_filter(self, client, admin_client, django_assert_num_queries):
+        titles, _, genres = create_titles(admin_client)
+        data = {'name': 'Смешанный', 'year': 2010, 'genre': [genres[1]['slug'], genres[2]['slug']],
+                'category': titles[0]['category']}
+        mixed_id = admin_client.post('/api/v1/titles/', data=data).json()['id']
+        cases = (
+            ({'genre': 'comedy,drama'}, {titles[0]['id'], titles[1]['id'], mixed_id}),
+            ({'genre': 'comedy,drama', 'genre_mode': 'any'}, {titles[0]['id'], titles[1]['id'], mixed_id}),
+            ({'genre': 'comedy,drama', 'genre_mode': 'all'}, {mixed_id}),
+            ({'genre': 'comedy,unknown', 'genre_mode': 'all'}, set()),
+            ({'genre': 'comedy,unknown'}, {titles[0]['id'], mixed_id}),
+        )
+        for params, expected in cases:
+            response = client.get('/api/v1/titles/', data=params)
+            ids = [title['id'] for title in response.json()['results']]
+            assert len(ids) == len(set(ids)) and set(ids) == expected and response.json()['count'] == len(expected), (
+                f'Проверьте, что GET запрос `/api/v1/titles/` с параметрами {params} возвращает '
+                'подходящие произведения без повторов'
+            )
+        response = client.get('/api/v1/titles/', data={'genre': 'comedy', 'genre_mode': 'some'})
+        assert response.status_code == 400, (
+            'Проверьте, что при неверном `genre_mode` возвращается статус 400'
+        )
+
+    @pytest.mark.django_db(transaction=True)
+    def test_12_titles_facets(self, client, admin_client, django_assert_num_queries):
+        titles, categories, genres = create_titles(admin_client)
+        url = '/api/v1/titles/facets/'
+        response = client.get(url)
+        assert response.status_code == 200 and response['X-Cache'] == 'MISS', (
+            f'Проверьте, что при GET запросе `{url}` без токена авторизации возвращается статус 200'
+        )
+        assert response.json() == {
+            'genre': [
+                {'slug': 'comedy', 'count': 1}, {'slug': 'drama', 'count': 1}, {'slug': 'horror', 'count': 1}
+            ],
+            'category': [{'slug': 'books', 'count': 1}, {'slug': 'films', 'count': 1}],
+            'year': [{'year': 2000, 'count': 1}, {'year': 2020, 'count': 1}],
+        }, (
+            f'Проверьте, что `{url}` возвращает количество произведений по жанрам, категориям и годам'
+        )
+        params = {'category': categories[0]['slug'], 'search': 'пике'}
+        response = client.get(url, data=params)
+        assert response.json() == {
+            'genre': [{'slug': 'comedy', 'count': 1}, {'slug': 'horror', 'count': 1}],
+            'category': [{'slug': 'films', 'count': 1}],
+            'year': [{'year': 2000, 'count': 1}],
+        }, (
+            f'Проверьте, что `{url}` учитывает параметры фильтра произведений'
+        )
+        with django_assert_num_queries(0):
+            response = client.get(url, data=params)
+        assert response['X-Cache'] == 'HIT', (
+            f'Проверьте, что повторный GET запрос `{url}` с теми же параметрами отдаётся из кэша'
+        )
+        admin_client.delete(f'/api/v1/titles/{titles[0]["id"]}/')
+        response = client.get(url, data=params)
+        assert response.json()['year'] == [], (
+            f'Проверьте, что изменение произведений сбрасывает кэш `{url}`'
+        )
+
+    @pytest.mark.django_db(transaction=True)
+    def test_13_compact_links(self, client, admin_client):
+        from io import StringIO
+
+        from django.core.management import call_command
+        from reviews.models import Title, TitleGenre
+
+        titles, categories, genres = create_titles(admin_client)
+        admin_client.delete(f'/api/v1/genres/{genres[0]["slug"]}/')
+        admin_client.delete(f'/api/v1/titles/{titles[1]["id"]}/')
+        admin_client.delete(f'/api/v1/categories/{categories[0]["slug"]}/')
+        admin_client.post('/api/v1/categories/', data={'name': 'Разное', 'slug': 'other'})
+        client.get(f'/api/v1/titles/{titles[0]["id"]}/')
+        out = StringIO()
+        call_command('compact_links', '--batch', '1', '--category', 'other', '--timing', stdout=out)
+        assert not TitleGenre.objects.filter(title=None).exists() and not TitleGenre.objects.filter(genre=None).exists(), (
+            'Проверьте, что команда `compact_links` удаляет связи без произведения или жанра'
+        )
+        assert TitleGenre.objects.count() == 1 and 'Удалено связей: 2, перенесено произведений: 1' in out.getvalue(), (
+            'Проверьте, что команда `compact_links` сообщает число удалённых связей и перенесённых произведений'
+        )
+        assert 'соединение связей:' in out.getvalue(), (
+            'Проверьте, что команда `compact_links` с `--timing` сообщает время соединения связей'
+        )
+        assert Title.objects.get(pk=titles[0]['id']).category.slug == 'other'
+        response = client.get(f'/api/v1/titles/{titles[0]["id"]}/')
+        assert response.json()['category']['slug'] == 'other', (
+            'Проверьте, что перенос произведений в другую категорию сбрасывает их кэш'
+        )
+
+    @pytest.mark.django_db(transaction=True)
+    def test_14_invalidation_after_commit(self, client, admin_client):
+        from django.db import transaction
+        from reviews.models import Title
+
+        titles, _, _ = create_titles(admin_client)
+        url = f'/api/v1/titles/{titles[0]["id"]}/'
+        client.get(url)
+        with transaction.atomic():
+            Title.objects.filter(pk=titles[0]['id']).update(name='Новое название')
+            Title.objects.get(pk=titles[0]['id']).save()
+            assert client.get(url)['X-Cache'] == 'HIT', (
+                'Проверьте, что кэш произведения сбрасывается только после фиксации транзакции'
+            )
+        response = client.get(url)
+        assert response['X-Cache'] == 'MISS' and response.json()['name'] == 'Новое название', (
+            'Проверьте, что после фиксации транзакции кэш произведения сброшен'
+        )
+
+    @pytest.mark.django_db(transaction=True)
+    def test_15_update_keeps_counters(self, admin_client, monkeypatch):
+        from api.views import TitlesViewSet
+        from reviews.models import Title
+
+        titles, _, _ = create_titles(admin_client)
+        title_id = titles[0]['id']
+        get_object = TitlesViewSet.get_object
+
+        version = Title.objects.get(pk=title_id).version
+
+        def get_object_then_review(view):
+            title = get_object(view)
+            Title.update_rating(title_id, score=9, count=1)
+            return title
+
+        monkeypatch.setattr(TitlesViewSet, 'get_object', get_object_then_review)
+        response = admin_client.patch(f'/api/v1/titles/{title_id}/', data={'name': 'Новое название'})
+        assert response.status_code == 200
+        title = Title.objects.get(pk=title_id)
+        assert (title.name, title.score_sum, title.review_count) == ('Новое название', 9, 1), (
+            'Проверьте, что изменение произведения не затирает счётчики рейтинга, сдвинутые после его чтения'
+        )
+        assert title.version == version + 2, (
+            'Проверьте, что изменение произведения не возвращает версию, уже выданную после его чтения'
+        )
+
+    def test_16_cache_keys_never_expire(self):
+        import pickle
+
+        from api.cache import (CACHE_HITS, LIST_GENERATION, bump_generation,
+                               cache_stats, count_access)
+        from django.core.cache import cache
+
+        def expiry(key):
+            with open(cache._key_to_file(key), 'rb') as file:
+                return pickle.load(file)
+
+        before = cache.get(LIST_GENERATION)
+        bump_generation(LIST_GENERATION)
+        bump_generation(LIST_GENERATION)
+        assert cache.get(LIST_GENERATION) != before and expiry(LIST_GENERATION) is None, (
+            'Проверьте, что сдвиг поколения не назначает ключу поколения таймаут'
+        )
+        hits = cache_stats()['hits']
+        count_access(hit=True)
+        count_access(hit=True)
+        assert cache_stats()['hits'] == hits + 2 and expiry(CACHE_HITS) is None, (
+            'Проверьте, что счётчики попаданий кэша не получают таймаут при увеличении'
+        )
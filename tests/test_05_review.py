@@ -334,3 +334,147 @@ class Test05ReviewAPI:
             'без токена авторизации возвращается статус 401'
         )
         self.check_permissions(user, 'обычного пользователя', reviews, titles)
+
+    @pytest.mark.django_db(transaction=True)
+    def test_05_rating_counters(self, admin_client, admin):
+        from django.core.management import call_command
+        from reviews.models import Title
+
+        reviews, titles, user, moderator = create_reviews(admin_client, admin)
+        title = Title.objects.get(pk=titles[0]['id'])
+        assert (title.score_sum, title.review_count) == (12, 3), (
+            'Проверьте, что при создании рецензий обновляются счётчики `score_sum` и `review_count` произведения'
+        )
+        user.delete()
+        response = admin_client.get(f'/api/v1/titles/{titles[0]["id"]}/')
+        assert response.json().get('rating') == 4, (
+            'Проверьте, что при удалении пользователя пересчитывается `rating` произведений с его отзывами'
+        )
+        Title.objects.update(score_sum=0, review_count=0)
+        call_command('recount_ratings')
+        title.refresh_from_db()
+        assert (title.score_sum, title.review_count) == (9, 2), (
+            'Проверьте, что команда `recount_ratings` пересчитывает счётчики рейтинга по рецензиям'
+        )
+
+    @pytest.mark.django_db(transaction=True)
+    def test_06_conditional_get(self, client, admin_client, admin, django_assert_num_queries):
+        reviews, titles, user, moderator = create_reviews(admin_client, admin)
+        title_url = f'/api/v1/titles/{titles[0]["id"]}/'
+        reviews_url = f'{title_url}reviews/'
+        for url, num_queries in ((title_url, 0), (reviews_url, 1)):
+            response = client.get(url)
+            etag = response.get('ETag')
+            assert etag, (
+                f'Проверьте, что при GET запросе `{url}` возвращается заголовок `ETag`'
+            )
+            with django_assert_num_queries(num_queries):
+                response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+            assert response.status_code == 304, (
+                f'Проверьте, что при GET запросе `{url}` с актуальным `If-None-Match` возвращается статус 304'
+            )
+        reviews_etag = client.get(reviews_url)['ETag']
+        client_user = auth_client(user)
+        client_user.patch(f'{reviews_url}{reviews[1]["id"]}/', data={'text': 'Новый текст'})
+        response = client.get(reviews_url, HTTP_IF_NONE_MATCH=reviews_etag)
+        assert response.status_code == 200 and response['ETag'] != reviews_etag, (
+            'Проверьте, что изменение отзыва меняет `ETag` списка отзывов произведения'
+        )
+        reviews_etag = response['ETag']
+        admin_client.post(f'{reviews_url}{reviews[0]["id"]}/comments/', data={'text': 'Комментарий'})
+        response = client.get(reviews_url, HTTP_IF_NONE_MATCH=reviews_etag)
+        assert response.status_code == 200, (
+            'Проверьте, что добавление комментария меняет `ETag` произведения'
+        )
+        title_etag = client.get(title_url)['ETag']
+        user.delete()
+        response = client.get(title_url, HTTP_IF_NONE_MATCH=title_etag)
+        assert response.status_code == 200 and response.json()['rating'] == 4, (
+            'Проверьте, что удаление автора отзыва меняет `ETag` и `rating` произведения'
+        )
+
+    @pytest.mark.django_db(transaction=True)
+    def test_07_duplicate_review(self, admin_client, admin):
+        from api.serializers import DUPLICATE_REVIEW
+
+        titles, _, _ = create_titles(admin_client)
+        url = f'/api/v1/titles/{titles[0]["id"]}/reviews/'
+        self.create_review(admin_client, titles[0]['id'], 'Первый', 6)
+        response = admin_client.post(url, data={'text': 'Второй', 'score': 1})
+        assert response.status_code == 400 and response.json() == {'non_field_errors': [DUPLICATE_REVIEW]}, (
+            f'Проверьте, что при повторном POST запросе `{url}` возвращается статус 400 с ошибкой дубликата'
+        )
+        response = admin_client.get(f'/api/v1/titles/{titles[0]["id"]}/')
+        assert response.json()['rating'] == 6, (
+            'Проверьте, что отклонённый повторный отзыв не меняет `rating` произведения'
+        )
+
+    @pytest.mark.django_db(transaction=True)
+    def test_08_recent_reviews(self, client, admin_client, admin, django_assert_num_queries):
+        reviews, titles, user, moderator = create_reviews(admin_client, admin)
+        self.create_review(admin_client, titles[1]['id'], 'Свежий', 9)
+        with django_assert_num_queries(1):
+            response = client.get('/api/v1/reviews/recent/')
+        assert response.status_code == 200, (
+            'Проверьте, что при GET запросе `/api/v1/reviews/recent/` без токена авторизации возвращается статус 200'
+        )
+        results = response.json()['results']
+        assert [review['text'] for review in results] == ['Свежий', 'qwerty321', 'qwerty123', 'qwerty'], (
+            'Проверьте, что `/api/v1/reviews/recent/` возвращает отзывы всех произведений от новых к старым'
+        )
+        assert results[0]['title_name'] == titles[1]['name'] and results[0]['author'] == admin.username, (
+            'Проверьте, что в ленте `/api/v1/reviews/recent/` есть название произведения и автор отзыва'
+        )
+
+    @pytest.mark.django_db(transaction=True)
+    def test_09_comments_preview(self, client, admin_client, admin, django_assert_num_queries):
+        reviews, titles, user, moderator = create_reviews(admin_client, admin)
+        url = f'/api/v1/titles/{titles[0]["id"]}/reviews/'
+        comment_ids = []
+        for number in range(4):
+            response = admin_client.post(f'{url}{reviews[0]["id"]}/comments/', data={'text': f'Первый {number}'})
+            comment_ids.append(response.json()['id'])
+        response = admin_client.post(f'{url}{reviews[1]["id"]}/comments/', data={'text': 'Второй'})
+        second_id = response.json()['id']
+        response = client.get(url)
+        assert 'comments_preview' not in response.json()['results'][0], (
+            f'Проверьте, что без `include` при GET запросе `{url}` комментарии не встраиваются'
+        )
+        with django_assert_num_queries(4):
+            response = client.get(url, data={'include': 'comments_preview'})
+        assert response.status_code == 200
+        previews = {
+            review['id']: [comment['id'] for comment in review['comments_preview']]
+            for review in response.json()['results']
+        }
+        assert previews == {
+            reviews[0]['id']: comment_ids[:0:-1],
+            reviews[1]['id']: [second_id],
+            reviews[2]['id']: [],
+        }, (
+            f'Проверьте, что `{url}?include=comments_preview` встраивает в каждый отзыв три последних комментария'
+        )
+
+    @pytest.mark.django_db(transaction=True)
+    def test_10_update_keeps_comments_count(self, admin_client, admin, monkeypatch):
+        from api.views import ReviewViewSet
+        from reviews.models import Review
+
+        reviews, titles, user, moderator = create_reviews(admin_client, admin)
+        review_id = reviews[0]['id']
+        get_object = ReviewViewSet.get_object
+
+        def get_object_then_comment(view):
+            review = get_object(view)
+            Review.update_comments_count(review_id, 1)
+            return review
+
+        monkeypatch.setattr(ReviewViewSet, 'get_object', get_object_then_comment)
+        response = admin_client.patch(
+            f'/api/v1/titles/{titles[0]["id"]}/reviews/{review_id}/', data={'text': 'Новый текст'}
+        )
+        assert response.status_code == 200
+        review = Review.objects.get(pk=review_id)
+        assert (review.text, review.comments_count) == ('Новый текст', 1), (
+            'Проверьте, что изменение отзыва не затирает счётчик комментариев, сдвинутый после его чтения'
+        )
@@ -246,3 +246,157 @@ class Test06CommentAPI:
             'без токена авторизации возвращается статус 401'
         )
         self.check_permissions(user, 'обычного пользователя', f'{pre_url}{comments[2]["id"]}/')
+
+    @pytest.mark.django_db(transaction=True)
+    def test_05_comments_query_budget(self, client, admin_client, admin, django_assert_num_queries):
+        comments, reviews, titles, _, _ = create_comments(admin_client, admin)
+        url = f'/api/v1/titles/{titles[0]["id"]}/reviews/{reviews[0]["id"]}/comments/'
+        with django_assert_num_queries(3):
+            response = client.get(url)
+        assert {comment['author'] for comment in response.json()['results']} == {
+            comment['author'] for comment in comments
+        }, (
+            f'Проверьте, что при GET запросе `{url}` возвращаются авторы комментариев'
+        )
+        with django_assert_num_queries(3):
+            response = client.get(f'/api/v1/titles/{titles[0]["id"]}/reviews/')
+        assert len(response.json()['results']) == len(reviews), (
+            'Проверьте, что при GET запросе `/api/v1/titles/{title_id}/reviews/` возвращаются все отзывы'
+        )
+        response = client.get(f'/api/v1/titles/{titles[1]["id"]}/reviews/{reviews[0]["id"]}/comments/')
+        assert response.status_code == 404, (
+            'Проверьте, что комментарии отзыва недоступны по адресу другого произведения'
+        )
+
+    @pytest.mark.django_db(transaction=True)
+    def test_06_comments_count(self, client, admin_client, admin):
+        from django.core.management import call_command
+        from reviews.models import Review
+
+        comments, reviews, titles, user, moderator = create_comments(admin_client, admin)
+        reviews_url = f'/api/v1/titles/{titles[0]["id"]}/reviews/'
+        response = client.get(reviews_url)
+        counts = {review['id']: review['comments_count'] for review in response.json()['results']}
+        assert counts == {reviews[0]['id']: 3, reviews[1]['id']: 0, reviews[2]['id']: 0}, (
+            f'Проверьте, что при GET запросе `{reviews_url}` возвращается `comments_count` каждого отзыва'
+        )
+        admin_client.delete(f'{reviews_url}{reviews[0]["id"]}/comments/{comments[0]["id"]}/')
+        user.delete()
+        response = client.get(f'{reviews_url}{reviews[0]["id"]}/')
+        assert response.json()['comments_count'] == 1, (
+            'Проверьте, что `comments_count` уменьшается при удалении комментария и его автора'
+        )
+        Review.objects.update(comments_count=0)
+        call_command('recount_comments')
+        assert Review.objects.get(pk=reviews[0]['id']).comments_count == 1, (
+            'Проверьте, что команда `recount_comments` пересчитывает счётчики комментариев'
+        )
+
+    @pytest.mark.django_db(transaction=True)
+    def test_07_comment_threads(self, client, admin_client, admin, django_assert_num_queries):
+        comments, reviews, titles, user, moderator = create_comments(admin_client, admin)
+        url = f'/api/v1/titles/{titles[0]["id"]}/reviews/{reviews[0]["id"]}/comments/'
+        root = comments[0]['id']
+        response = admin_client.post(url, data={'text': 'Ответ', 'parent': root})
+        assert response.status_code == 201 and response.json()['depth'] == 1, (
+            f'Проверьте, что при POST запросе `{url}` с `parent` создаётся ответ на комментарий'
+        )
+        reply = response.json()['id']
+        nested = admin_client.post(url, data={'text': 'Ответ на ответ', 'parent': reply}).json()['id']
+        other_url = f'/api/v1/titles/{titles[0]["id"]}/reviews/{reviews[1]["id"]}/comments/'
+        response = admin_client.post(other_url, data={'text': 'Чужая ветка', 'parent': root})
+        assert response.status_code == 400, (
+            'Проверьте, что нельзя ответить на комментарий к другому отзыву'
+        )
+        with django_assert_num_queries(3):
+            response = client.get(f'{url}{root}/thread/')
+        assert [comment['id'] for comment in response.json()] == [root, reply, nested], (
+            f'Проверьте, что при GET запросе `{url}{{comment_id}}/thread/` возвращается вся ветка по порядку'
+        )
+        response = client.get(f'{url}{root}/thread/?depth=1')
+        assert [comment['id'] for comment in response.json()] == [root, reply], (
+            'Проверьте, что параметр `depth` ограничивает глубину ветки'
+        )
+        with django_assert_num_queries(4):
+            response = client.get(f'{url}threads/')
+        data = response.json()
+        assert data['count'] == 3 and [len(thread['replies']) for thread in data['results']] == [0, 0, 2], (
+            f'Проверьте, что при GET запросе `{url}threads/` возвращаются верхние комментарии с ответами'
+        )
+        admin_client.delete(f'{url}{root}/')
+        response = client.get(f'/api/v1/titles/{titles[0]["id"]}/reviews/{reviews[0]["id"]}/')
+        assert response.json()['comments_count'] == 2, (
+            'Проверьте, что при удалении комментария удаляется вся его ветка и уменьшается `comments_count`'
+        )
+
+    @pytest.mark.django_db(transaction=True)
+    def test_08_moderation_purge(self, client, admin_client, admin):
+        import json
+
+        comments, reviews, titles, user, moderator = create_comments(admin_client, admin)
+        url = '/api/v1/moderation/purge/'
+        data = {'author': user.username}
+        response = auth_client(user).post(url, data=data)
+        assert response.status_code == 403, (
+            f'Проверьте, что при POST запросе `{url}` обычным пользователем возвращается статус 403'
+        )
+        client_moderator = auth_client(moderator)
+        response = client_moderator.post(url, data={})
+        assert response.status_code == 400, (
+            f'Проверьте, что при POST запросе `{url}` без автора и списков id возвращается статус 400'
+        )
+        response = client_moderator.post(url, data=data)
+        assert response.status_code == 200 and response.json() == {
+            'reviews': 1, 'comments': 1, 'titles': [titles[0]['id']]
+        }, (
+            f'Проверьте, что POST запрос `{url}` удаляет все отзывы и комментарии автора'
+        )
+        title_url = f'/api/v1/titles/{titles[0]["id"]}/'
+        assert client.get(title_url).json()['rating'] == 4, (
+            'Проверьте, что после массового удаления пересчитывается `rating` произведения'
+        )
+        review_url = f'{title_url}reviews/{reviews[0]["id"]}/'
+        assert client.get(review_url).json()['comments_count'] == 2, (
+            'Проверьте, что после массового удаления пересчитывается `comments_count` отзыва'
+        )
+        comments_url = f'{review_url}comments/'
+        reply = admin_client.post(comments_url, data={'text': 'Ответ', 'parent': comments[0]['id']}).json()['id']
+        admin_client.post(comments_url, data={'text': 'Ответ на ответ', 'parent': reply})
+        response = client_moderator.post(
+            url, data=json.dumps({'comments': [comments[0]['id']]}), content_type='application/json'
+        )
+        assert response.status_code == 200 and response.json()['comments'] == 3, (
+            f'Проверьте, что POST запрос `{url}` удаляет комментарии по списку id вместе с ответами на них'
+        )
+        assert client.get(review_url).json()['comments_count'] == 1, (
+            'Проверьте, что удаление комментариев по списку id пересчитывает `comments_count` отзыва'
+        )
+
+    @pytest.mark.django_db(transaction=True)
+    def test_09_user_activity(self, client, admin_client, admin, django_assert_num_queries):
+        comments, reviews, titles, user, moderator = create_comments(admin_client, admin)
+        url = f'/api/v1/users/{admin.username}/reviews/'
+        with django_assert_num_queries(2):
+            response = client.get(url)
+        assert response.status_code == 200, (
+            f'Проверьте, что при GET запросе `{url}` без токена авторизации возвращается статус 200'
+        )
+        results = response.json()['results']
+        assert [(review['id'], review['title_name']) for review in results] == [
+            (reviews[0]['id'], titles[0]['name'])
+        ], (
+            f'Проверьте, что `{url}` возвращает только отзывы пользователя с названием произведения'
+        )
+        url = f'/api/v1/users/{moderator.username}/comments/'
+        with django_assert_num_queries(2):
+            response = client.get(url)
+        results = response.json()['results']
+        assert [(comment['id'], comment['review'], comment['title']) for comment in results] == [
+            (comments[2]['id'], reviews[0]['id'], titles[0]['id'])
+        ], (
+            f'Проверьте, что `{url}` возвращает только комментарии пользователя с отзывом и произведением'
+        )
+        response = client.get('/api/v1/users/nobody/comments/')
+        assert response.status_code == 404, (
+            'Проверьте, что для несуществующего пользователя возвращается статус 404'
+        )